@@ -21,7 +21,7 @@ from mo_logs import Log
 from mo_json import value2json
 from mo_http import http
 from jx_python import jx
-from pyLibrary.sql.sqlite import Sqlite
+from jx_sqlite.sqlite import Sqlite, quote_value
 from mo_threads import Thread
 from mo_threads import Till
 from mo_times.dates import Date
@@ -31,7 +31,7 @@ from mo_times.timer import Timer
 ACTIVE_DATA = "http://activedata.allizom.org/query"
 RUN_TIME = 10 * 60
 MAX_SIZE = 10000
-QUOTED_INVALID = Sqlite().quote_value(value2json("invalid"))
+QUOTED_INVALID = quote_value(value2json("invalid")).sql
 
 
 def backfill_recent(cache, settings, index_queue, please_stop):
@@ -47,9 +47,9 @@ def backfill_recent(cache, settings, index_queue, please_stop):
             " SELECT " +
             "    key, annotate" +
             " FROM files " +
-            " WHERE substr(name, 1, " + text(len(prefix)) + ")=" + db.quote_value(prefix) +
+            " WHERE substr(name, 1, " + text(len(prefix)) + ")=" + quote_value(prefix).sql +
             " AND (annotate is NULL OR annotate <> " + QUOTED_INVALID + ")" +
-            " AND last_modified > " + db.quote_value(too_old.unix)
+            " AND last_modified > " + quote_value(too_old.unix).sql
         )
         return set(d[0] for d in result.data)
 
@@ -64,9 +64,9 @@ def backfill_recent(cache, settings, index_queue, please_stop):
             "    count(1) as number, " +
             "    avg(last_modified) as `avg` " +
             " FROM files " +
-            " WHERE substr(name, 1, " + text(len(prefix)) + ")=" + db.quote_value(prefix) +
+            " WHERE substr(name, 1, " + text(len(prefix)) + ")=" + quote_value(prefix).sql +
             " AND (annotate is NULL OR annotate <> " + QUOTED_INVALID + ")" +
-            " AND last_modified > " + db.quote_value(too_old.unix) +
+            " AND last_modified > " + quote_value(too_old.unix).sql +
             " GROUP BY substr(name, 1, " + text(len(prefix) + 1) + ")"
         )
 
@@ -124,9 +124,9 @@ def backfill_recent(cache, settings, index_queue, please_stop):
         if invalid:
             Log.note("{{num}} invalid keys", num=len(invalid))
             for g, some in jx.chunk(invalid, size=100):
-                db.execute(
+                db.query(
                     "UPDATE files SET annotate=" + QUOTED_INVALID + " WHERE key in (" +
-                    ",".join(db.quote_value(k) for k in some) +
+                    ",".join(quote_value(k).sql for k in some) +
                     ")"
                 )
         backfill.total += len(keys) - len(invalid)
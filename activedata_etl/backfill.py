@@ -10,14 +10,16 @@ from __future__ import division
 from __future__ import unicode_literals
 
 import jx_elasticsearch
+from activedata_etl.imports.s3_cache import S3Cache
 from jx_base.expressions import TRUE
 from jx_python import jx
+from jx_sqlite.sqlite import Sqlite
 from mo_dots import coalesce
 from mo_future import text
 from mo_logs import Log
 from mo_logs import startup, constants
 from mo_logs.exceptions import suppress_exception
-from mo_math import MAX, MIN, ceiling, log10
+from mo_math import MAX, MIN
 from mo_times.dates import Date
 from mo_times.timer import Timer
 from pyLibrary import aws
@@ -134,54 +136,25 @@ def get_all_in_es(esq, in_range, es_filter, field):
 
 
 def get_all_s3(in_es, in_range, settings):
-    in_s3 = []
-    min_range = coalesce(MIN(in_range), 0)
-    bucket = s3.Bucket(settings.source)
+    """
+    :return: THE LARGEST limit PRIMARY NUMBERS IN THE S3 INVENTORY, BUT NOT IN ES
+    """
     limit = coalesce(settings.limit, 1000)
-    max_allowed = MAX([settings.range.max, MAX(in_es)])
-    extra_digits = ceiling(log10(MIN([max_allowed-settings.range.min, limit])))
     source_prefix = coalesce(settings.source.prefix, "")
+    db = Sqlite(filename=coalesce(settings.cache, "backfill") + "." + settings.source.bucket + ".sqlite", upgrade=False)
+    with Timer("Update inventory of S3 bucket {{bucket}}", {"bucket": settings.source.bucket}):
+        inventory = S3Cache(db=db, kwargs=settings.source)
+
+    in_s3 = inventory.get_nums(
+        source_prefix.rstrip("."),
+        min_num=MIN(in_range),
+        max_num=MAX(in_range)
+    )
 
-    prefix = text(max(in_range - in_es))[:-extra_digits]
-    prefix_max = int(prefix + ("999999999999"[:extra_digits]))
-    while prefix != "0" and len(in_s3) < limit and min_range <= prefix_max:
-        # EVERYTHING FROM S3
-        with Timer(
-            "Scanning S3 bucket {{bucket}} with prefix {{prefix|quote}}",
-            {"bucket": bucket.name, "prefix": source_prefix+prefix}
-        ):
-            prefixes = set()
-            for p in bucket.list(prefix=source_prefix+prefix, delimiter=":"):
-                if p.name.startswith("bb.") or p.name.startswith("tc."):
-                    pp = p.name.split(":")[0].split(".")[1]
-                else:
-                    pp = p.name.split(":")[0].split(".")[0]
-                prefixes.add(pp)
-            prefixes = list(prefixes)
-
-        for i, q in enumerate(prefixes):
-            if i % 1000 == 0:
-                Log.note("Scrubbed {{p|percent(decimal=1)}}", p=i / len(prefixes))
-            try:
-                p = int(q)
-                if in_range and p not in in_range:
-                    continue
-                if p in in_es:
-                    continue
-                # if p >= max_allowed:
-                #     continue
-
-                in_s3.append(p)
-            except Exception as e:
-                Log.note("delete key? {{key|quote}}", key=q)
-
-        if prefix == "":
-            break
-        prefix = text(int(prefix) - 1)
-        prefix_max = int(prefix + ("999999999999"[:extra_digits]))
-
-    in_s3 = jx.reverse(jx.sort(in_s3))[:limit:]
-    return in_s3
+    missing = in_s3 - in_es
+    if in_range:
+        missing &= in_range
+    return jx.reverse(jx.sort(missing))[:limit:]
 
 
 def main():
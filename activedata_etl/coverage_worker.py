@@ -0,0 +1,106 @@
+# encoding: utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Contact: Kyle Lahnakoski (klahnakoski@mozilla.com)
+#
+
+# CHILD PROCESS OF activedata_etl.imports.coverage_pool.CoveragePool
+# READS ONE ARTIFACT REQUEST PER LINE FROM stdin, AND WRITES THE ENCODED
+# RECORDS, THE LOGS, AND THE RESULT, TO stdout
+
+from __future__ import division
+from __future__ import unicode_literals
+
+from activedata_etl.imports.coverage_pool import LINE_PREFIX, READY
+from activedata_etl.imports.file_mapper import FileMapper
+from activedata_etl.transforms.grcov_to_es import process_grcov_artifact
+from activedata_etl.transforms.jsdcov_to_es import process_jsdcov_artifact
+from activedata_etl.transforms.jsvm_to_es import process_jsvm_artifact
+from activedata_etl.transforms.per_test_to_es import process_per_test_artifact
+from mo_dots import Data
+from mo_json import json2value, value2json
+from mo_logs import Except, Log
+from mo_logs.log_usingNothing import StructuredLogger
+from mo_threads import Lock, Signal
+from mo_threads.threads import STDIN, STDOUT
+from tuid.client import TuidClient
+
+ARTIFACT_PROCESSORS = {
+    "grcov": process_grcov_artifact,
+    "jsdcov": process_jsdcov_artifact,
+    "jsvm": process_jsvm_artifact,
+    "per_test": process_per_test_artifact
+}
+
+stdout_lock = Lock("stdout")
+please_stop = Signal()
+
+
+def _write(line):
+    with stdout_lock:
+        STDOUT.write(line.encode("utf8") + b"\n")
+        STDOUT.flush()
+
+
+class _Pipe(object):
+    """
+    STAND-IN FOR THE DESTINATION, SENDS THE LINES TO THE PARENT PROCESS
+    """
+
+    def write_lines(self, key, lines):
+        _write(value2json({"key": key}))
+        for line in lines:
+            _write(LINE_PREFIX + line)
+        _write(value2json({"end": key}))
+
+
+class _PipeLogger(StructuredLogger):
+    def write(self, template, params):
+        _write(value2json({"log": {"template": template, "params": params}}))
+
+
+def command_loop(resources):
+    _write(READY)
+    while not please_stop:
+        line = STDIN.readline()
+        if not line:
+            break
+        request = json2value(line.decode("utf8"))
+        if request.stop:
+            break
+
+        try:
+            if not resources.file_mapper:
+                resources.file_mapper = FileMapper(request.source_key, request.task_cluster_record)
+            keys = ARTIFACT_PROCESSORS[request.kind](
+                source_key=request.source_key,
+                resources=resources,
+                destination=_Pipe(),
+                task_cluster_record=request.task_cluster_record,
+                artifact=request.artifact,
+                artifact_etl=request.artifact_etl,
+                please_stop=please_stop
+            )
+            _write(value2json({"out": keys}))
+        except Exception as e:
+            _write(value2json({"err": Except.wrap(e)}))
+
+
+def start():
+    try:
+        config = json2value(STDIN.readline().decode("utf8"))
+        Log.start({"trace": True, "constants": config.constants})
+        Log.set_logger(_PipeLogger())
+        command_loop(Data(tuid_mapper=TuidClient(config.tuid_client)))
+    except Exception as e:
+        Log.error("problem starting coverage worker", cause=e)
+    finally:
+        please_stop.go()
+        Log.stop()
+
+
+if __name__ == "__main__":
+    start()
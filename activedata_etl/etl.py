@@ -13,6 +13,7 @@ from copy import deepcopy
 
 import mo_dots
 from activedata_etl import key2etl
+from activedata_etl.imports.coverage_pool import CoveragePool
 from activedata_etl.sinks.dummy_sink import DummySink
 from activedata_etl.sinks.s3_bucket import S3Bucket
 from activedata_etl.sinks.split import Split
@@ -28,7 +29,7 @@ from mo_logs import Log, startup, constants, strings
 from mo_logs.exceptions import suppress_exception, Except
 from mo_math import MIN
 from mo_testing import fuzzytestcase
-from mo_threads import Thread, Signal, Queue, Lock, Till, MAIN_THREAD
+from mo_threads import Thread, Signal, Queue, Lock, Till, MAIN_THREAD, THREAD_STOP
 from mo_times import Timer, Date, SECOND
 from pyLibrary import aws
 from pyLibrary.aws.s3 import strip_extension, key_prefix, KEY_IS_WRONG_FORMAT
@@ -60,6 +61,7 @@ class ETL(Thread):
         resources,
         please_stop,
         wait_forever=False,
+        concurrency=1,  # NUMBER OF MESSAGES THIS THREAD WILL PROCESS AT ONCE
         kwargs=None
     ):
         # FIND THE WORKERS METHODS
@@ -105,9 +107,14 @@ class ETL(Thread):
             self.work_queue = aws.Queue(work_queue)  # work queue created
         else:
             self.work_queue = work_queue
+        self.in_flight = 0  # NUMBER OF MESSAGES BEING PROCESSED BY _concurrent_loop()
+        self.in_flight_lock = Lock("in flight for " + name)
 
         # loop called which pulls work off of the work_queue >>
-        Thread.__init__(self, name, self.loop, please_stop=please_stop)
+        if concurrency > 1:
+            Thread.__init__(self, name, self._concurrent_loop, please_stop=please_stop)
+        else:
+            Thread.__init__(self, name, self.loop, please_stop=please_stop)
         Log.note("--- finished ETL setup ---")
         self.start()
 
@@ -220,18 +227,22 @@ class ETL(Thread):
                             Log.error("expecting keys to be contiguous: {{ids}}", ids=etl_ids)
                     # VERIFY KEYS EXIST
                     if hasattr(action._destination, "get_key"):
+                        # ONE LISTING FOR THE WHOLE FAMILY, SO get_key() IS ANSWERED FROM THE LISTING CACHE
+                        action._destination.keys(prefix=source_key)
                         for k in new_keys:
                             action._destination.get_key(k)
 
                 for n in action._notify:
-                    for k in new_keys:
-                        now = Date.now()
-                        n.add({
+                    now = Date.now()
+                    n.extend([
+                        {
                             "bucket": action._destination.bucket.name,
                             "key": k,
                             "timestamp": now.unix,
                             "date/time": now.format()
-                        })
+                        }
+                        for k in new_keys
+                    ])
 
                 if action.transform_type == "bulk":
                     continue
@@ -244,14 +255,16 @@ class ETL(Thread):
                 # WE DO NOT PUT KEYS ON WORK QUEUE IF ALREADY NOTIFYING SOME OTHER
                 # AND NOT GOING TO AN S3 BUCKET
                 if not action._notify and isinstance(action._destination, (aws.s3.Bucket, S3Bucket)):
-                    for k in old_keys | new_keys:
-                        now = Date.now()
-                        self.work_queue.add({
+                    now = Date.now()
+                    self.work_queue.extend([
+                        {
                             "bucket": action.destination.bucket,
                             "key": k,
                             "timestamp": now.unix,
                             "date/time": now.format()
-                        })
+                        }
+                        for k in old_keys | new_keys
+                    ])
             except Exception as e:
                 e = Except.wrap(e)
                 if "Key {{key}} does not exist" in e:
@@ -277,6 +290,62 @@ class ETL(Thread):
                 )
         return True
 
+    def _process(self, todo, commit, rollback):
+        """
+        DISPATCH ONE todo, AND CONFIRM IT WITH EITHER commit() OR rollback()
+        """
+        try:
+            Log.note("TODO: {{todo}}", todo=todo)
+            is_ok = self._dispatch_work(todo)
+            if is_ok:
+                commit()
+            else:
+                rollback()
+        except Exception as e:
+            # WE CERTAINLY EXPECT TO GET HERE IF SHUTDOWN IS DETECTED, NO NEED TO TELL HUMANS
+            e = Except.wrap(e)
+            if "Shutdown detected." in e:
+                rollback()
+                return
+
+            previous_attempts = coalesce(todo.previous_attempts, 0)
+            todo.previous_attempts = previous_attempts + 1
+
+            if previous_attempts < coalesce(self.settings.min_attempts, 3):
+                # SILENT
+                try:
+                    self.work_queue.add(todo)
+                    commit()
+                except Exception as f:
+                    # UNEXPECTED PROBLEM!!!
+                    rollback()
+                    Log.warning("Could not annotate todo", cause=[f, e])
+            elif previous_attempts > 10:
+                # GIVE UP
+                Log.warning(
+                    "After {{tries}} attempts, still could not process {{key}}.  ***REJECTED***",
+                    tries=todo.previous_attempts,
+                    key=todo.key,
+                    cause=e
+                )
+                commit()
+            else:
+                # COMPLAIN
+                try:
+                    self.work_queue.add(todo)
+                    commit()
+                except Exception as f:
+                    # UNEXPECTED PROBLEM!!!
+                    rollback()
+                    Log.warning("Could not annotate todo", cause=[f, e])
+
+                Log.warning(
+                    "After {{tries}} attempts, still could not process {{key}}.  Returned back to work queue.",
+                    tries=todo.previous_attempts,
+                    key=todo.key,
+                    cause=e
+                )
+
     def loop(self, please_stop):
         try:
             with self.work_queue:
@@ -309,61 +378,78 @@ class ETL(Thread):
                         self.work_queue.commit()
                         continue
 
-                    try:
-                        Log.note("TODO: {{todo}}", todo=todo)
-                        is_ok = self._dispatch_work(todo)
-                        if is_ok:
-                            self.work_queue.commit()
-                        else:
-                            self.work_queue.rollback()
-                    except Exception as e:
-                        # WE CERTAINLY EXPECT TO GET HERE IF SHUTDOWN IS DETECTED, NO NEED TO TELL HUMANS
-                        e = Except.wrap(e)
-                        if "Shutdown detected." in e:
-                            self.work_queue.rollback()
+                    self._process(todo, self.work_queue.commit, self.work_queue.rollback)
+        except Exception as e:
+            Log.warning("Failure in the ETL loop", cause=e)
+            raise e
+
+    def _concurrent_loop(self, please_stop):
+        """
+        KEEP UP TO settings.concurrency MESSAGES IN FLIGHT
+        EACH MESSAGE IS CONFIRMED (OR RETURNED) ON ITS OWN, NOT THROUGH THE SHARED QUEUE
+        """
+        concurrency = self.settings.concurrency
+        try:
+            with self.work_queue:
+                while not please_stop:
+                    with self.in_flight_lock:
+                        while self.in_flight >= concurrency and not please_stop:
+                            self.in_flight_lock.wait(till=please_stop)
+                    if please_stop:
+                        break
+
+                    if hasattr(self.work_queue, "pop_messages"):
+                        with self.in_flight_lock:
+                            available = concurrency - self.in_flight
+                        pairs = self.work_queue.pop_messages(
+                            wait=EXTRA_WAIT_TIME if self.settings.wait_forever else SECOND,
+                            max=available
+                        )
+                    else:
+                        pairs = [self.work_queue.pop_message(till=Till(till=Date.now().unix) | please_stop)]
+                    pairs = [p for p in pairs if p and p[1] != None and p[1] is not THREAD_STOP]
+
+                    if not pairs:
+                        if self.settings.wait_forever:
+                            continue
+                        # NOTHING LEFT TO DO, WAIT FOR THE IN-FLIGHT WORK TO FINISH
+                        with self.in_flight_lock:
+                            while self.in_flight and not please_stop:
+                                self.in_flight_lock.wait(till=please_stop)
+                        please_stop.go()
+                        return
+
+                    for message, todo in pairs:
+                        if isinstance(todo, text):
+                            Log.warning("Work queue had {{data|json}}, which is not valid", data=todo)
+                            message.delete()
                             continue
 
-                        previous_attempts = coalesce(todo.previous_attempts, 0)
-                        todo.previous_attempts = previous_attempts + 1
-
-                        if previous_attempts < coalesce(self.settings.min_attempts, 3):
-                            # SILENT
-                            try:
-                                self.work_queue.add(todo)
-                                self.work_queue.commit()
-                            except Exception as f:
-                                # UNEXPECTED PROBLEM!!!
-                                self.work_queue.rollback()
-                                Log.warning("Could not annotate todo", cause=[f, e])
-                        elif previous_attempts > 10:
-                            # GIVE UP
-                            Log.warning(
-                                "After {{tries}} attempts, still could not process {{key}}.  ***REJECTED***",
-                                tries=todo.previous_attempts,
-                                key=todo.key,
-                                cause=e
-                            )
-                            self.work_queue.commit()
-                        else:
-                            # COMPLAIN
-                            try:
-                                self.work_queue.add(todo)
-                                self.work_queue.commit()
-                            except Exception as f:
-                                # UNEXPECTED PROBLEM!!!
-                                self.work_queue.rollback()
-                                Log.warning("Could not annotate todo", cause=[f, e])
-
-                            Log.warning(
-                                "After {{tries}} attempts, still could not process {{key}}.  Returned back to work queue.",
-                                tries=todo.previous_attempts,
-                                key=todo.key,
-                                cause=e
-                            )
+                        with self.in_flight_lock:
+                            self.in_flight += 1
+                        Thread.run(
+                            "dispatch " + text(coalesce(todo.key, todo.keys)),
+                            self._concurrent_worker,
+                            message,
+                            todo,
+                            please_stop=please_stop
+                        ).release()
+
+                # CONFIRM THE IN-FLIGHT WORK BEFORE THE QUEUE IS CLOSED
+                with self.in_flight_lock:
+                    while self.in_flight:
+                        self.in_flight_lock.wait(till=Till(seconds=1))
         except Exception as e:
             Log.warning("Failure in the ETL loop", cause=e)
             raise e
 
+    def _concurrent_worker(self, message, todo, please_stop):
+        try:
+            self._process(todo, message.delete, message.rollback)
+        finally:
+            with self.in_flight_lock:
+                self.in_flight -= 1
+
 
 sinks_locker = Lock()
 sinks = []  # LIST OF (settings, sink) PAIRS
@@ -447,6 +533,14 @@ def main():
         )
 
         stopper = Signal()
+        if settings.coverage_pool:
+            # PARSE COVERAGE ARTIFACTS IN OTHER PROCESSES
+            resources.coverage_pool = CoveragePool(
+                tuid_client=settings.tuid_client,
+                constants=settings.constants,
+                kwargs=settings.coverage_pool
+            )
+            stopper.then(resources.coverage_pool.stop)
         for i in range(coalesce(settings.param.threads, 1)):
             ETL(
                 name="ETL Loop " + text(i),
@@ -0,0 +1,185 @@
+# encoding: utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Contact: Kyle Lahnakoski (klahnakoski@mozilla.com)
+#
+from __future__ import division
+from __future__ import unicode_literals
+
+import os
+import sys
+
+from mo_dots import set_default
+from mo_future import is_text, text
+from mo_json import json2value, value2json
+from mo_kwargs import override
+from mo_logs import Log, Except
+from mo_threads import Lock, Process, Queue, THREAD_STOP, Thread
+
+DEBUG = False
+WORKER = os.path.join("activedata_etl", "coverage_worker.py")
+LINE_PREFIX = " "  # RECORD LINES FROM THE WORKER START WITH THIS, EVERYTHING ELSE IS A JSON MESSAGE
+READY = '{"out":"ok"}'
+
+
+class CoveragePool(object):
+    """
+    PARSE COVERAGE ARTIFACTS IN size CHILD PROCESSES, SO WE ARE NOT LIMITED TO
+    THE ONE CORE THE GIL ALLOWS.  THE ENCODED RECORDS ARE STREAMED BACK, AND
+    WRITTEN TO THE DESTINATION BY THIS PROCESS.
+    """
+
+    @override
+    def __init__(self, size=4, tuid_client=None, constants=None, kwargs=None):
+        """
+        :param size: NUMBER OF WORKER PROCESSES
+        :param tuid_client: SETTINGS FOR EACH WORKER'S TuidClient
+        :param constants: MODULE CONSTANTS TO SET IN EACH WORKER
+        """
+        self.config = {"tuid_client": tuid_client, "constants": constants}
+        self.locker = Lock("coverage pool")
+        self.stopped = False  # True ONCE stop() IS CALLED; BUSY WORKERS ARE STOPPED WHEN THEY FINISH
+        self.idle = Queue("idle coverage workers")
+        for i in range(size):
+            name = "coverage worker " + text(i)
+            self.idle.add((name, self._start(name)))
+
+    def _start(self, name):
+        process = Process(name, [sys.executable, "-u", WORKER], debug=DEBUG, cwd=os.getcwd())
+        # EACH WORKER GETS ITS OWN TUID CACHE, SO THEY DO NOT FIGHT OVER THE sqlite LOCK
+        config = set_default(
+            {"tuid_client": {"db": {"filename": "tuid_client." + name.replace(" ", "_") + ".sqlite"}}},
+            self.config
+        )
+        process.stdin.add(value2json(config))
+        while True:
+            status = process.stdout.pop()
+            if status == READY:
+                break
+            elif status is THREAD_STOP:
+                Log.error(
+                    "could not start {{name}}\n{{error|indent}}",
+                    name=name,
+                    error=process.stderr.pop_all()
+                )
+            Log.note("{{name}}: {{line}}", name=name, line=status)
+        Thread.run(name + " stderr", _stderr, process).release()
+        return process
+
+    def process_artifact(self, kind, source_key, destination, task_cluster_record, artifact, artifact_etl, please_stop):
+        """
+        SAME AS THE process_<kind>_artifact FUNCTIONS, BUT DONE BY A WORKER PROCESS
+        :return: LIST OF KEYS WRITTEN TO destination
+        """
+        idle = self.idle.pop(till=please_stop)
+        if idle is None or idle is THREAD_STOP:
+            Log.error("Shutdown detected. Stopping coverage ETL.")
+        name, worker = idle
+        done = False  # True WHEN THE WORKER IS READY FOR ANOTHER ARTIFACT
+        try:
+            worker.stdin.add(value2json({
+                "kind": kind,
+                "source_key": source_key,
+                "task_cluster_record": task_cluster_record,
+                "artifact": artifact,
+                "artifact_etl": artifact_etl
+            }))
+            messages = _messages(worker, please_stop)
+            for message in messages:
+                if is_text(message):
+                    Log.error("Expecting a message, not a record line")
+                elif message.key:
+                    destination.write_lines(message.key, _lines(messages))
+                elif "out" in message:
+                    done = True
+                    return message.out
+                elif "err" in message:
+                    done = True
+                    Log.error("Problem in {{name}}", name=worker.name, cause=Except.new_instance(message.err))
+        finally:
+            if not done:
+                # WE DO NOT KNOW WHAT THE WORKER IS DOING, START ANOTHER
+                worker.stop()
+                if not please_stop and not self.stopped:
+                    Log.warning("{{name}} did not finish, starting another", name=name)
+                    worker = self._start(name)
+            self._release(name, worker)
+
+    def _release(self, name, worker):
+        with self.locker:
+            if not self.stopped:
+                self.idle.add((name, worker))
+                return
+        # THE POOL IS STOPPED, DO NOT RETURN THE WORKER TO IT
+        _stop_worker(worker)
+
+    def stop(self):
+        with self.locker:
+            self.stopped = True
+            idle = self.idle.pop_all()
+            # RELEASE ANY process_artifact() WAITING FOR A WORKER
+            self.idle.add(THREAD_STOP)
+        for i in idle:
+            if i is not THREAD_STOP:
+                _stop_worker(i[1])
+
+
+def _stop_worker(worker):
+    if not worker.stdin.closed:
+        worker.stdin.add(value2json({"stop": True}))
+    worker.stop()
+    worker.join()
+
+
+def _messages(worker, please_stop):
+    """
+    GENERATE MESSAGES, AND RECORD LINES, FROM THE WORKER; LOGS ARE HANDLED HERE
+    """
+    while True:
+        line = worker.stdout.pop(till=please_stop)
+        if please_stop:
+            Log.error("Shutdown detected. Stopping coverage ETL.")
+        elif line is THREAD_STOP:
+            Log.error("{{name}} stopped unexpectedly", name=worker.name)
+        elif line is None:
+            continue
+        elif line.startswith(LINE_PREFIX):
+            yield line[len(LINE_PREFIX):]
+            continue
+
+        try:
+            message = json2value(line)
+        except Exception:
+            Log.note("{{name}}: {{line}}", name=worker.name, line=line)
+            continue
+
+        if "log" in message:
+            Log.main_log.write(message.log.template, message.log.params)
+        else:
+            yield message
+
+
+def _lines(messages):
+    """
+    THE RECORD LINES OF ONE KEY
+    """
+    for message in messages:
+        if is_text(message):
+            yield message
+        elif message.end:
+            return
+        else:
+            Log.error("Expecting record lines, not {{message|json}}", message=message)
+
+
+def _stderr(process, please_stop):
+    while not please_stop:
+        line = process.stderr.pop(till=please_stop)
+        if line is THREAD_STOP:
+            break
+        elif line is None:
+            continue
+        Log.note("Error line from {{name}}({{pid}}): {{line}}", line=line, name=process.name, pid=process.pid)
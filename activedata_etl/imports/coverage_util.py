@@ -10,12 +10,14 @@ from __future__ import division
 from __future__ import unicode_literals
 
 from jx_python import jx
-from mo_dots import listwrap
+from mo_dots import Data, is_data, listwrap, set_default, split_field, wrap
+from mo_json import value2json
 from mo_logs import Log, Except
 from mo_times import Timer
 from mo_http import http
 
 TUID_BLOCK_SIZE = 1000
+TUID_PIPELINE = 8  # NUMBER OF BLOCKS ANNOTATED AT ONCE
 DEBUG = True
 LANGUAGE_MAPPINGS = [
     ("c/c++", (".c", ".cpp", ".h", ".cc", ".cxx", ".hh", ".hpp", ".hxx")),
@@ -33,50 +35,54 @@ def tuid_batches(source_key, task_cluster_record, resources, iterator, path="fil
             s[path].total_covered != 0 or s[path].total_uncovered != 0
         )
 
-    def _annotate_sources(sources):
+    def _annotate_sources(chunks):
         """
-        :param sources: LIST OF COVERAGE SOURCE STRUCTURES TO MARKUP
+        :param chunks: LIST OF LISTS OF COVERAGE SOURCE STRUCTURES TO MARKUP
         :return: NOTHING, sources ARE MARKED UP
         """
         try:
             branch = task_cluster_record.repo.branch.name
             revision = task_cluster_record.repo.changeset.id[:12]
-            sources = listwrap(sources)
-            filenames = [s[path].name for s in sources if has_tuids(s)]
+            chunks = [listwrap(sources) for sources in chunks]
+            requests = [
+                (branch, revision, [s[path].name for s in sources if has_tuids(s)])
+                for sources in chunks
+            ]
 
-            with Timer("markup sources for {{num}} files", {"num": len(filenames)}, too_long=1):
+            with Timer("markup sources for {{num}} files", {"num": sum(len(f) for _, _, f in requests)}, too_long=1):
                 # WHAT DO WE HAVE
-                found = resources.tuid_mapper.get_tuids(branch, revision, filenames)
-                if found == None:
-                    return  # THIS IS A FAILURE STATE, AND A WARNING HAS ALREADY BEEN RAISED, DO NOTHING
-
-                for source in sources:
-                    if (
-                        DEBUG
-                        and source[path].total_covered + source[path].total_uncovered
-                        > 100000
-                    ):
-                        Log.warning(
-                            "lines={{num}}, file={{name}}",
-                            name=source[path].name,
-                            num=source[path].total_covered
-                            + source[path].total_uncovered,
-                        )
-
-                    if not has_tuids(source):
-                        continue
-                    line_to_tuid = found.get(source[path].name)
-                    if line_to_tuid != None:
-                        source[path].tuid_covered = [
-                            line_to_tuid[line]
-                            for line in source.file.covered
-                            if line_to_tuid[line]
-                        ]
-                        source[path].tuid_uncovered = [
-                            line_to_tuid[line]
-                            for line in source.file.uncovered
-                            if line_to_tuid[line]
-                        ]
+                results = resources.tuid_mapper.get_many(requests)
+
+                for sources, found in zip(chunks, results):
+                    if found == None:
+                        continue  # THIS IS A FAILURE STATE, AND A WARNING HAS ALREADY BEEN RAISED, DO NOTHING
+                    for source in sources:
+                        if (
+                            DEBUG
+                            and source[path].total_covered + source[path].total_uncovered
+                            > 100000
+                        ):
+                            Log.warning(
+                                "lines={{num}}, file={{name}}",
+                                name=source[path].name,
+                                num=source[path].total_covered
+                                + source[path].total_uncovered,
+                            )
+
+                        if not has_tuids(source):
+                            continue
+                        line_to_tuid = found.get(source[path].name)
+                        if line_to_tuid != None:
+                            source[path].tuid_covered = [
+                                line_to_tuid[line]
+                                for line in source.file.covered
+                                if line_to_tuid[line]
+                            ]
+                            source[path].tuid_uncovered = [
+                                line_to_tuid[line]
+                                for line in source.file.uncovered
+                                if line_to_tuid[line]
+                            ]
         except Exception as e:
             e = Except.wrap(e)
             resources.tuid_mapper.enabled = False
@@ -87,10 +93,74 @@ def tuid_batches(source_key, task_cluster_record, resources, iterator, path="fil
                     cause=e
                 )
 
-    for g, records in jx.chunk(iterator, size=TUID_BLOCK_SIZE):
-        _annotate_sources(records)
-        for r in records:
-            yield r
+    # ANNOTATE TUID_PIPELINE CHUNKS AT ONCE, SO THEIR REQUESTS ARE SENT CONCURRENTLY
+    chunks = (records for _, records in jx.chunk(iterator, size=TUID_BLOCK_SIZE))
+    for _, pipeline in jx.chunk(chunks, size=TUID_PIPELINE):
+        _annotate_sources(pipeline)
+        for records in pipeline:
+            for r in records:
+                yield r
+
+
+class RecordEmitter(object):
+    """
+    ENCODE MANY RECORDS THAT SHARE ONE LARGE TEMPLATE (LIKE THE task_cluster_record)
+    THE TEMPLATE IS ENCODED ONCE, ONLY THE varying PROPERTIES ARE ENCODED FOR EACH RECORD
+    """
+
+    def __init__(self, template, varying):
+        """
+        :param template: PROPERTIES SHARED BY ALL RECORDS
+        :param varying: PATHS (eg "etl.id") OF THE PROPERTIES THAT CHANGE WITH EACH RECORD
+        """
+        self.plan = _plan(wrap(template), [split_field(v) for v in varying])
+
+    def encode(self, record):
+        """
+        :param record: THE varying PROPERTIES OF ONE RECORD
+        :return: JSON OF set_default(record, template)
+        """
+        return _encode(self.plan, wrap(record))
+
+
+def _plan(template, paths):
+    """
+    :return: (constant, varying) PAIR, WHERE constant IS THE JSON OF THE MEMBERS
+             THAT DO NOT CHANGE, AND varying IS A LIST OF (name, prefix, deeper, default)
+    """
+    names = set(p[0] for p in paths)
+    constant = value2json({k: v for k, v in template.items() if k not in names})[1:-1]
+    varying = []
+    for name in sorted(names):
+        prefix = value2json(name) + ":"
+        deeper = [p[1:] for p in paths if p[0] == name and len(p) > 1]
+        if deeper and [name] not in paths:
+            sub_template = template[name]
+            if not is_data(sub_template):
+                sub_template = Data()
+            varying.append((name, prefix, _plan(sub_template, deeper), None))
+        else:
+            varying.append((name, prefix, None, template[name]))
+    return constant, varying
+
+
+def _encode(plan, record):
+    constant, varying = plan
+    members = [constant] if constant else []
+    for name, prefix, deeper, default in varying:
+        value = record[name]
+        if deeper:
+            members.append(prefix + _encode(deeper, value if is_data(value) else Data()))
+            continue
+        if is_data(value):
+            if is_data(default):
+                set_default(value, default)
+        elif value == None:
+            value = default
+            if value == None and not is_data(value):
+                continue
+        members.append(prefix + value2json(value))
+    return "{" + ",".join(members) + "}"
 
 
 def download_file(url, destination):
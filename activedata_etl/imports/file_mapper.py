@@ -9,21 +9,37 @@
 from __future__ import division
 from __future__ import unicode_literals
 
+import hashlib
+import os
 import re
+from collections import OrderedDict
 
 from activedata_etl.imports.coverage_util import download_file
 from activedata_etl.transforms import ACTIVE_DATA_QUERY
 from jx_python.expressions import jx_expression_to_function
 from mo_dots import coalesce
 from mo_dots.lists import last
-from mo_files import TempFile
+from mo_files import File, TempFile
 from mo_future import text
 from mo_json import stream
 from mo_logs import Log, Except
+from mo_threads import Lock
 from mo_times import Timer, Date, Duration
 from mo_http import http
 from mo_http.big_data import scompressed2ibytes
 
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+INDEX_DIRECTORY = "file_mapper"  # WHERE PREBUILT INDEXES ARE KEPT, SHARED BY ALL PROCESSES; None TO DISABLE
+MAX_INDEX_FILES = 20  # NUMBER OF MOST RECENTLY USED INDEXES KEPT IN INDEX_DIRECTORY
+MAX_INDEXES = 3  # NUMBER OF MOST RECENTLY USED INDEXES KEPT IN MEMORY
+INDEX_NAME = re.compile(r"^[0-9a-f]{40}\.pickle$")  # NOT THE TEMP FILES OF _save_index()
+WORDS = re.compile(r"\W")
+NOTHING = frozenset()
+
 
 class FileMapper(object):
     """
@@ -68,25 +84,9 @@ class FileMapper(object):
             lambda filename: "cargo/registry/src/github.com" in filename
         )
         self.known_failures = set()
-        self.lookup = {}
         for files_url in result.data.url:
             try:
-                with TempFile() as tempfile:
-                    Log.note("download {{url}}", url=files_url)
-                    download_file(files_url, tempfile.abspath)
-                    with open(tempfile.abspath, str("rb")) as fstream:
-                        with Timer("process {{url}}", param={"url": files_url}):
-                            count = 0
-                            for data in stream.parse(
-                                scompressed2ibytes(fstream), {"items": "."}, {"name"}
-                            ):
-                                self._add(data.name)
-                                count += 1
-                            Log.note(
-                                "{{count}} files in {{file}}",
-                                count=count,
-                                file=files_url,
-                            )
+                self.index = _get_index(files_url)
                 return
             except Exception as e:
                 e = Except.wrap(e)
@@ -112,27 +112,6 @@ class FileMapper(object):
                 cause=e,
             )
 
-    def _add(self, filename):
-        if filename.startswith(EXCLUDE):
-            return
-
-        path = list(reversed(filename.split("/")))
-        curr = self.lookup
-        for i, p in enumerate(path):
-            found = curr.get(p)
-            if not found:
-                curr[p] = filename
-                return
-            elif isinstance(found, text):
-                if i + 1 >= len(path):
-                    curr[p] = {".": filename}
-                else:
-                    curr[p] = {path[i + 1]: filename}
-                self._add(found)
-                return
-            else:
-                curr = found
-
     def find(self, source_key, filename, artifact, task_cluster_record):
         """
         :param source_key: FOR DEBUGGING
@@ -144,14 +123,20 @@ class FileMapper(object):
 
         def find_best(files, complain):
             filename_words = (
-                set(n for n in re.split(r"\W", filename) if n) | suite_names
+                set(n for n in WORDS.split(filename) if n) | suite_names
             )
+            # COUNT THE WORDS EACH CANDIDATE SHARES WITH filename, USING THE INVERTED INDEX
+            shared = {}
+            for w in filename_words:
+                for f in self.index.words.get(w, NOTHING) & files:
+                    shared[f] = shared.get(f, 0) + 1
+
             best = None
             best_score = 0
             peer = None
-            for f in files:
-                f_words = set(n for n in re.split("\W", f) if n)
-                score = len(filename_words & f_words) / len(filename_words | f_words)
+            for f in sorted(shared):
+                intersection = shared[f]
+                score = intersection / (len(filename_words) + self.index.sizes[f] - intersection)
                 if score > best_score:
                     best = f
                     peer = None
@@ -171,7 +156,7 @@ class FileMapper(object):
                         key=source_key,
                         url=artifact.url,
                         filename=filename,
-                        list=files,
+                        list=sorted(files),
                     )
                 return {"name": filename}
 
@@ -196,7 +181,7 @@ class FileMapper(object):
                 .split("#")[0]
             )  # FOR URLS WITH PARAMETERS
             path = list(reversed(filename.split("/")))
-            curr = self.lookup
+            curr = self.index.lookup
             i = -1
             for i, p in enumerate(path):
                 if p == ".":
@@ -214,7 +199,7 @@ class FileMapper(object):
 
             if i == 0:  # WE MATCH NOTHING, DO NOT EVEN TRY FOR A BETTER MATCH
                 return {"name": filename}
-            return find_best(list(sorted(_values(curr))), i > 1)
+            return find_best(set(_values(curr)), i > 1)
         except Exception as ee:
             Log.warning(
                 "Can not resolve {{filename}} in {{url}} for key {{key}}",
@@ -225,6 +210,146 @@ class FileMapper(object):
             )
 
 
+class _Index(object):
+    """
+    THE FILES OF ONE components.json.gz
+    """
+
+    def __init__(self, lookup=None, words=None, sizes=None):
+        self.lookup = lookup or {}  # TRIE OF THE REVERSED PATH, LEAVES ARE FILENAMES
+        self.words = words or {}  # MAP FROM WORD TO SET OF FILENAMES
+        self.sizes = sizes or {}  # MAP FROM FILENAME TO NUMBER OF DISTINCT WORDS
+
+    def add(self, filename):
+        if filename.startswith(EXCLUDE):
+            return
+        self._add(filename)
+        words = set(n for n in WORDS.split(filename) if n)
+        for w in words:
+            files = self.words.get(w)
+            if files is None:
+                self.words[w] = files = set()
+            files.add(filename)
+        self.sizes[filename] = len(words)
+
+    def _add(self, filename):
+        path = list(reversed(filename.split("/")))
+        curr = self.lookup
+        for i, p in enumerate(path):
+            found = curr.get(p)
+            if not found:
+                curr[p] = filename
+                return
+            elif isinstance(found, text):
+                if i + 1 >= len(path):
+                    curr[p] = {".": filename}
+                else:
+                    curr[p] = {path[i + 1]: filename}
+                self._add(found)
+                return
+            else:
+                curr = found
+
+
+_indexes = OrderedDict()  # MAP FROM URL TO _Index, FOR THIS PROCESS, LEAST RECENTLY USED FIRST
+_indexes_locker = Lock("file mapper indexes")
+
+
+def _get_index(files_url):
+    """
+    :return: _Index FOR THE components.json.gz AT files_url, FROM MEMORY, DISK, OR BY DOWNLOAD
+    """
+    with _indexes_locker:
+        index = _indexes.pop(files_url, None)
+        if index:
+            _indexes[files_url] = index  # MOVE TO MOST-RECENTLY-USED END
+            return index
+
+    index_file = _index_file(files_url)
+    if index_file and index_file.exists:
+        try:
+            with Timer("load index for {{url}}", param={"url": files_url}):
+                with open(index_file.abspath, str("rb")) as fstream:
+                    index = _Index(**pickle.load(fstream))
+            os.utime(index_file.abspath, None)  # SO _save_index() EVICTS THE LEAST RECENTLY USED
+            _remember(files_url, index)
+            return index
+        except Exception as e:
+            Log.warning("Can not load {{file}}, rebuilding", file=index_file.abspath, cause=e)
+
+    index = _Index()
+    with TempFile() as tempfile:
+        Log.note("download {{url}}", url=files_url)
+        download_file(files_url, tempfile.abspath)
+        with open(tempfile.abspath, str("rb")) as fstream:
+            with Timer("process {{url}}", param={"url": files_url}):
+                count = 0
+                for data in stream.parse(
+                    scompressed2ibytes(fstream), {"items": "."}, {"name"}
+                ):
+                    index.add(data.name)
+                    count += 1
+                Log.note(
+                    "{{count}} files in {{file}}",
+                    count=count,
+                    file=files_url,
+                )
+    if index_file:
+        _save_index(index_file, index)
+    _remember(files_url, index)
+    return index
+
+
+def _remember(files_url, index):
+    with _indexes_locker:
+        _indexes[files_url] = index
+        while len(_indexes) > MAX_INDEXES:
+            _indexes.popitem(last=False)
+
+
+def _index_file(files_url):
+    if not INDEX_DIRECTORY:
+        return None
+    return File(INDEX_DIRECTORY) / (hashlib.sha1(files_url.encode("utf8")).hexdigest() + ".pickle")
+
+
+def _save_index(index_file, index):
+    """
+    WRITE TO A TEMP NAME, THEN RENAME, SO OTHER PROCESSES NEVER SEE A PARTIAL INDEX
+    """
+    try:
+        directory = index_file.parent
+        try:
+            directory.create()
+        except Exception:
+            if not directory.exists:
+                raise
+            # ANOTHER PROCESS MADE IT FIRST
+        temp = index_file.add_suffix("." + text(os.getpid()))
+        with open(temp.abspath, str("wb")) as fstream:
+            pickle.dump(
+                {"lookup": index.lookup, "words": index.words, "sizes": index.sizes},
+                fstream,
+                pickle.HIGHEST_PROTOCOL
+            )
+        os.rename(temp.abspath, index_file.abspath)
+    except Exception as e:
+        Log.warning("Can not save {{file}}", file=index_file.abspath, cause=e)
+        return
+
+    # EVICT THE LEAST RECENTLY USED INDEXES
+    try:
+        existing = sorted(
+            (f for f in directory.children if INDEX_NAME.match(os.path.basename(f.abspath))),
+            key=lambda f: f.timestamp,
+            reverse=True
+        )
+        for f in existing[MAX_INDEX_FILES:]:
+            f.delete()
+    except Exception as e:
+        Log.warning("Can not clean {{dir}}", dir=directory.abspath, cause=e)
+
+
 def _values(curr):
     for v in curr.values():
         if isinstance(v, text):
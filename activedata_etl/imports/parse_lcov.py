@@ -15,6 +15,7 @@ from __future__ import unicode_literals
 
 import json
 import sys
+from array import array
 
 from activedata_etl.imports.coverage_util import LANGUAGE_MAPPINGS
 from mo_dots import wrap, Null
@@ -25,7 +26,8 @@ DEBUG_LINE_LIMIT = False
 EMIT_RECORDS_WITH_ZERO_COVERAGE = True
 LINE_LIMIT = 10000
 
-COMMANDS = ('TN:', 'SF:', 'FNF:', 'FNH:', 'LF:', 'LH:', 'LN:', 'DA:', 'FN:', 'FNDA:', 'BRDA:', 'BRF:', 'BRH:', 'end_of_record')
+# DA: IS THE BULK OF EVERY FILE, SO IT IS CHECKED BEFORE ANY OTHER COMMAND
+DA_PREFIX = 'DA:'
 
 
 def parse_lcov_coverage(source_key, source_name, stream):
@@ -38,100 +40,150 @@ def parse_lcov_coverage(source_key, source_name, stream):
     :param stream:
     :return:
     """
-
-    current_source = None
-    done = set()
+    state = _State(source_key, source_name)
 
     for line in stream:
         try:
-            if len(line) == 0:
-                continue
-            elif not line.startswith(COMMANDS):
-                source_file += "\n" + line
-                continue
-
-            line = line.strip()
-
-            if line == 'end_of_record':
-                for source in coco_format(current_source):
-                    if source.file.total_covered > LINE_LIMIT:
-                        if DEBUG_LINE_LIMIT:
-                            Log.warning("{{name}} has {{num}} lines covered", name=source.file.name, num=source.file.total_covered)
-                    elif source.file.total_uncovered > LINE_LIMIT:
-                        if DEBUG_LINE_LIMIT:
-                            Log.warning("{{name}} has {{num}} lines uncovered", name=source.file.name, num=source.file.total_uncovered)
-                    elif EMIT_RECORDS_WITH_ZERO_COVERAGE:
-                        yield source
-                    elif source.file.total_covered:
-                        yield source
-                current_source = None
-            elif ':' in line:
-                cmd, data = line.split(":", 1)
-
-                if cmd == 'TN':
-                    test_name = data.strip()
-                elif cmd == 'SF':
-                    source_file = data
-                    if source_file in done:
-                        Log.error("Note expected to revisit a file")
-                    current_source = {
-                        'file': source_file,
-                        'functions': {},
-                        'lines_covered': set(),
-                        'lines_uncovered': set()
-                    }
-                elif cmd == 'FNF':
-                    functions_found = int(data)
-                elif cmd == 'FNH':
-                    functions_hit = int(data)
-                elif cmd == 'LF':
-                    lines_found = int(data)
-                elif cmd == 'LH':
-                    lines_hit = int(data)
-                elif cmd == 'DA':
-                    line_number, execution_count = n_tuple(map(lambda v: int(v) if v else 0, data.split(",")), 2)
-                    if execution_count > 0:
-                        current_source['lines_covered'].add(line_number)
+            if line.startswith(DA_PREFIX):
+                # FAST PATH: DA:<line number>,<execution count>[,<checksum>]
+                data = line[3:].split(",", 2)
+                try:
+                    if int(data[1]) > 0:
+                        state.covered(int(data[0]))
                     else:
-                        current_source['lines_uncovered'].add(line_number)
-                elif cmd == 'FN':
-                    min_line, function_name = data.split(",", 1)
-
-                    current_source['functions'][function_name] = {
-                        'start': int(min_line),
-                        'execution_count': 0
-                    }
-                elif cmd == 'FNDA':
-                    try:
-                        fn_execution_count, function_name = data.split(",", 1)
-                        try:
-                            current_source['functions'][function_name]['execution_count'] = int(fn_execution_count)
-                        except Exception as e:
-                            if fn_execution_count != "0":
-                                if DEBUG:
-                                    Log.note("No mention of FN:{{func}}, but it has been called", func=function_name, cause=e)
-                    except Exception as e:
-                        Log.warning("problem with FNDA line {{line|quote}}", line=line, cause=e)
-                elif cmd == 'BRDA':
-                    # BRDA:<line number>,<block number>,<branch number>,<taken>
-                    # <taken> is a number or a dash ("-") or does not exist
-                    line, block, branch, taken = n_tuple(data.split(","), 4)
+                        state.uncovered(int(data[0]))
+                    continue
+                except (ValueError, IndexError):
+                    # EMPTY, OR MISSING, VALUES ARE LEFT TO THE SLOW PATH
                     pass
-                elif cmd == 'BRF':
-                    num_branches_found = data
-                elif cmd == 'BRH':
-                    num_branches_hit = data
-                else:
-                    Log.error('Unsupported cmd {{cmd}} with data {{data}} in {{source|quote}} for key {{key}}', key=source_key, source=source_name, cmd=cmd, data=data)
-            else:
-                Log.error("unknown line {{line}} in {{source}}", line=line, source=source_name)
+            elif len(line) == 0:
+                continue
+
+            cmd, _, data = line.strip().partition(":")
+            command = COMMANDS.get(cmd)
+            if command is None:
+                if not line.startswith(PREFIXES):
+                    # NOT A COMMAND, PROBABLY THE REST OF A FILE NAME WITH A LINE BREAK
+                    continue
+                Log.error('Unsupported cmd {{cmd}} with data {{data}} in {{source|quote}} for key {{key}}', key=source_key, source=source_name, cmd=cmd, data=data)
+            for source in command(state, data):
+                yield source
         except Exception as e:
             Log.error("Problem in line {{line}} in {{source}}", line=line, source=source_name, cause=e)
 
 
+class _State(object):
+    """
+    THE FILE BEING PARSED
+    """
+    __slots__ = ["source_key", "source_name", "done", "current_source", "covered", "uncovered"]
+
+    def __init__(self, source_key, source_name):
+        self.source_key = source_key
+        self.source_name = source_name
+        self.done = set()
+        self.current_source = None
+        self.covered = None  # append() OF current_source['lines_covered']
+        self.uncovered = None  # append() OF current_source['lines_uncovered']
+
+
+def _source_file(state, data):
+    if data in state.done:
+        Log.error("Note expected to revisit a file")
+    lines_covered = array(str('I'))
+    lines_uncovered = array(str('I'))
+    state.current_source = {
+        'file': data,
+        'functions': {},
+        'lines_covered': lines_covered,
+        'lines_uncovered': lines_uncovered
+    }
+    state.covered = lines_covered.append
+    state.uncovered = lines_uncovered.append
+    return ()
+
+
+def _line_data(state, data):
+    line_number, execution_count = n_tuple(map(lambda v: int(v) if v else 0, data.split(",")), 2)
+    if execution_count > 0:
+        state.covered(line_number)
+    else:
+        state.uncovered(line_number)
+    return ()
+
+
+def _function(state, data):
+    min_line, function_name = data.split(",", 1)
+
+    state.current_source['functions'][function_name] = {
+        'start': int(min_line),
+        'execution_count': 0
+    }
+    return ()
+
+
+def _function_data(state, data):
+    try:
+        fn_execution_count, function_name = data.split(",", 1)
+        try:
+            state.current_source['functions'][function_name]['execution_count'] = int(fn_execution_count)
+        except Exception as e:
+            if fn_execution_count != "0":
+                if DEBUG:
+                    Log.note("No mention of FN:{{func}}, but it has been called", func=function_name, cause=e)
+    except Exception as e:
+        Log.warning("problem with FNDA line {{line|quote}}", line="FNDA:" + data, cause=e)
+    return ()
+
+
+def _end_of_record(state, data):
+    for source in coco_format(state.current_source):
+        if source.file.total_covered > LINE_LIMIT:
+            if DEBUG_LINE_LIMIT:
+                Log.warning("{{name}} has {{num}} lines covered", name=source.file.name, num=source.file.total_covered)
+        elif source.file.total_uncovered > LINE_LIMIT:
+            if DEBUG_LINE_LIMIT:
+                Log.warning("{{name}} has {{num}} lines uncovered", name=source.file.name, num=source.file.total_uncovered)
+        elif EMIT_RECORDS_WITH_ZERO_COVERAGE:
+            yield source
+        elif source.file.total_covered:
+            yield source
+    state.current_source = None
+    state.covered = None
+    state.uncovered = None
+
+
+def _ignore(state, data):
+    # TN, FNF, FNH, LF, LH, LN, BRDA, BRF, BRH ARE NOT USED
+    return ()
+
+
+COMMANDS = {
+    'TN': _ignore,
+    'SF': _source_file,
+    'FNF': _ignore,
+    'FNH': _ignore,
+    'LF': _ignore,
+    'LH': _ignore,
+    'LN': _ignore,
+    'DA': _line_data,
+    'FN': _function,
+    'FNDA': _function_data,
+    'BRDA': _ignore,
+    'BRF': _ignore,
+    'BRH': _ignore,
+    'end_of_record': _end_of_record
+}
+# A LINE STARTING WITH ONE OF THESE IS A RECORD, NOT THE REST OF A FILE NAME
+PREFIXES = tuple(c if c == 'end_of_record' else c + ':' for c in COMMANDS)
+
+
 def coco_format(details):
     # TODO: DO NOT IGNORE METHODS
-    coverable_line_count = len(details['lines_covered']) + len(details['lines_uncovered'])
+    # LINES ARE COLLECTED IN array('I'), WITH POSSIBLE DUPLICATES
+    covered = sorted(set(details['lines_covered']))
+    uncovered = sorted(set(details['lines_uncovered']))
+    coverable_line_count = len(covered) + len(uncovered)
     language = [lang for lang, extensions in LANGUAGE_MAPPINGS if details['file'].endswith(extensions)]
 
     source = wrap({
@@ -139,11 +191,11 @@ def coco_format(details):
         "is_file": True,
         "file": {
             "name": details['file'],
-            'covered': sorted(details["lines_covered"]),
-            'uncovered': sorted(details['lines_uncovered']),
-            "total_covered": len(details['lines_covered']),
-            "total_uncovered": len(details['lines_uncovered']),
-            "percentage_covered": len(details['lines_covered']) / coverable_line_count if coverable_line_count else None
+            'covered': covered,
+            'uncovered': uncovered,
+            "total_covered": len(covered),
+            "total_uncovered": len(uncovered),
+            "percentage_covered": len(covered) / coverable_line_count if coverable_line_count else None
         }
     })
 
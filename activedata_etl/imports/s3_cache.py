@@ -9,59 +9,57 @@
 from __future__ import division
 from __future__ import unicode_literals
 
+from jx_python import jx
+from jx_sqlite.sqlite import quote_value, quote_column
+from mo_dots import listwrap
 from mo_future import text
 from mo_kwargs import override
-
-from mo_dots import listwrap
 from mo_logs import Log
 from mo_threads import Signal
 from mo_threads import Thread
 from mo_times.dates import Date
 from pyLibrary import aws
-from jx_python import jx
 
 DEBUG = True
+BATCH_SIZE = 100  # NUMBER OF KEYS IN EACH LIST, AND EACH upsert
+RELIST = 1000  # num BELOW THE LARGEST SEEN THAT ARE LISTED AGAIN, FOR BLOCKS WRITTEN OUT OF ORDER
 
 
 class S3Cache(object):
+    """
+    LOCAL, INDEXED, INVENTORY OF THE KEYS IN A BUCKET
+
+    EACH KEY IS RECORDED WITH ITS prefix ("tc", "bb" OR "") AND ITS PRIMARY
+    NUMBER (num), SO GAPS CAN BE FOUND WITH RANGE QUERIES ON THE
+    (bucket, prefix, num) INDEX. EACH RUN CONTINUES LISTING FROM relist BELOW
+    THE LARGEST num ALREADY SEEN, SO ONLY NEW KEYS, AND RECENT BLOCKS WRITTEN
+    OUT OF ORDER, ARE LISTED.
+    """
 
     @override
-    def __init__(self, db, bucket, key_format, kwargs):
+    def __init__(self, db, bucket, key_format, prefix=None, relist=RELIST, kwargs=None):
+        """
+        :param prefix: ONLY KEEP THE KEYS WITH THIS prefix (eg "tc."), DEFAULT IS THE prefixes OF key_format
+        :param relist: NUMBER OF num, BELOW THE LARGEST SEEN, TO LIST AGAIN ON EACH RUN
+        """
         self.bucket = aws.s3.Bucket(kwargs)
         self.db = db
-        details = self.db.query("PRAGMA table_info(files)")
-        if not details.data:
-            self.db.execute("""
-                CREATE TABLE files (
-                   bucket TEXT,
-                   key TEXT,
-                   name TEXT,
-                   last_modified REAL,
-                   size INTEGER,
-                   annotate TEXT, 
-                   CONSTRAINT pk PRIMARY KEY (bucket, name)
-                )            
-            """)
         self.settings = kwargs
         self.up_to_date = Signal()
-        if key_format.startswith("t."):
-            suffix = db.quote_value(key_format[3])
-            selector = "cast(substr(name, 4, instr(substr(name, 4), " + suffix + ") - 1) as decimal)"
-            prefixes = [
-                {"prefix": "tc", "selector": selector},
-                {"prefix": "bb", "selector": selector}
-            ]
+        if prefix:
+            prefixes = [prefix.rstrip(".")]
+        elif key_format.startswith("t."):
+            prefixes = ["tc", "bb"]
         else:
-            suffix = db.quote_value(key_format[1])
-            selector = "cast(substr(name, 1, instr(name, " + suffix + ") - 1) as decimal)"
-            prefixes = [
-                {"prefix": "", "selector": selector}
-            ]
+            prefixes = [""]
+        suffix = quote_value(key_format[3] if key_format.startswith("t.") else key_format[1]).sql
+        self.prefixes = [{"prefix": p, "selector": _selector(p, suffix)} for p in prefixes]
+        self._setup()
 
         result = db.query("SELECT sum(size) FROM files")
         Log.note("{{source}} has {{num|comma}} bytes of data", source=bucket, num=result.data[0][0])
 
-        threads = [self._top_up(**p) for p in prefixes]
+        threads = [self._top_up(p["prefix"]) for p in self.prefixes]
         for t in threads:
             t.join()
 
@@ -70,64 +68,82 @@ class S3Cache(object):
 
         self.up_to_date.go()
 
-
-    def _top_up(self, prefix, selector):
-        def update(prefix, bucket, please_stop):
-            if prefix:
-                result = self.db.query(
-                    " SELECT max(" + selector + ") as " + self.db.quote_column("max") +
-                    " FROM files " +
-                    " WHERE bucket=" + self.db.quote_value(bucket.name) +
-                    " AND substr(name, 1, " + text(len(prefix)) + ")=" + self.db.quote_value(prefix)
+    def _setup(self):
+        details = self.db.query("PRAGMA table_info(files)")
+        if not details.data:
+            self.db.query("""
+                CREATE TABLE files (
+                   bucket TEXT,
+                   key TEXT,
+                   name TEXT,
+                   last_modified REAL,
+                   size INTEGER,
+                   annotate TEXT,
+                   prefix TEXT,
+                   num INTEGER,
+                   CONSTRAINT pk PRIMARY KEY (bucket, name)
                 )
-                maximum = result.data[0][0]
-                for mp in listwrap(self.settings.min_primary):
-                    if mp.startswith(prefix):
-                        mini = int(mp.split(".")[1].split(":")[0])
-                        if not (mini <= maximum):
-                            maximum = mini
+            """)
+        elif "num" not in [d[1] for d in details.data]:
+            # INVENTORY FROM BEFORE THE prefix AND num COLUMNS
+            Log.note("Add prefix and num columns to files")
+            self.db.query("ALTER TABLE files ADD COLUMN prefix TEXT")
+            self.db.query("ALTER TABLE files ADD COLUMN num INTEGER")
+            for p in self.prefixes:
+                self.db.query(
+                    "UPDATE files SET " +
+                    " prefix=" + quote_value(p["prefix"]).sql + "," +
+                    " num=" + p["selector"] +
+                    " WHERE " + _prefix_filter(p["prefix"])
+                )
+        self.db.query("CREATE INDEX IF NOT EXISTS files_num ON files (bucket, prefix, num)")
 
-                if maximum:
-                    biggest = prefix + "." + text(maximum)
+    def _top_up(self, prefix):
+        def list_from(prefix, bucket, start, please_stop):
+            """
+            ADD THE KEYS WITH num >= start, LISTED FROM THE start MARKER
+            """
+            if prefix:
+                if start:
+                    biggest = prefix + "." + text(start)
                 else:
                     biggest = prefix + "."
             else:
-                result = self.db.query(
-                    " SELECT max(" + selector + ") as " + self.db.quote_column("max") +
-                    " FROM files " +
-                    " WHERE bucket=" + self.db.quote_value(bucket.name)
-                )
-                maximum = result.data[0][0]
-                if maximum:
-                    biggest = text(maximum)
+                if start:
+                    biggest = text(start)
                 else:
                     biggest = None
             bad_count = 0
-            for g, metas in jx.chunk(bucket.bucket.list(prefix=prefix, marker=biggest), size=100):
+            for g, metas in jx.chunk(bucket.bucket.list(prefix=prefix, marker=biggest), size=BATCH_SIZE):
                 if please_stop:
                     Log.error("Request to stop encountered")
                 if bad_count > 100:
-                    # Log.note("Bad count is {{count}}", count=bad_count)
                     Log.note("Exit because 1000 records show nothing older")
                     return
                 data = []
                 delete_me = []
                 for meta in metas:
-                    primary = int(meta.key[len(prefix):].lstrip(".").split(".")[0].split(":")[0])
+                    try:
+                        primary = int(meta.key[len(prefix):].lstrip(".").split(".")[0].split(":")[0])
+                    except Exception:
+                        Log.note("delete key? {{key|quote}}", key=meta.key)
+                        continue
                     if bucket.name == "active-data-jobs" and primary > 2000:
                         delete_me.append(meta.key)
                         continue
 
-                    if primary < maximum:
+                    if start is not None and primary < start:
                         continue
 
-                    data.append((
-                        bucket.name,
-                        meta.key.split(".json")[0],
-                        meta.key,
-                        Date(meta.last_modified).unix,
-                        meta.size
-                    ))
+                    data.append({
+                        "bucket": bucket.name,
+                        "key": meta.key.split(".json")[0],
+                        "name": meta.key,
+                        "last_modified": Date(meta.last_modified).unix,
+                        "size": meta.size,
+                        "prefix": prefix,
+                        "num": primary
+                    })
 
                 if delete_me:
                     Log.note("delete keys {{key}}", key=delete_me)
@@ -137,40 +153,92 @@ class S3Cache(object):
                 if data:
                     bad_count = 0
                     if DEBUG:
-                        Log.note("add {{num}} keys to cache for prefix {{prefix|quote}} ({{biggest}})", num=len(data), prefix=prefix, biggest=sorted(d[1] for d in data)[-1])
+                        Log.note("add {{num}} keys to cache for prefix {{prefix|quote}} ({{biggest}})", num=len(data), prefix=prefix, biggest=sorted(d["key"] for d in data)[-1])
 
                     self.upsert_to_db(data)
                 else:
                     bad_count += 1
+
+        def update(prefix, bucket, please_stop):
+            # THE INDEX MAKES THIS A SINGLE LOOKUP
+            maximum = self.db.query(
+                " SELECT max(num) FROM files " +
+                " WHERE bucket=" + quote_value(bucket.name).sql +
+                " AND prefix=" + quote_value(prefix).sql
+            ).data[0][0]
+
+            if maximum is None:
+                start = None
+            else:
+                # KEYS ARE LISTED IN STRING ORDER, SO DO NOT GO BELOW THE SAME NUMBER OF DIGITS
+                start = max(maximum - self.settings.relist, 10 ** (len(text(maximum)) - 1))
+
+            if prefix:
+                for mp in listwrap(self.settings.min_primary):
+                    if mp.startswith(prefix):
+                        mini = int(mp.split(".")[1].split(":")[0])
+                        if start is None or start < mini:
+                            start = mini
+
+            list_from(prefix, bucket, start, please_stop)
+            if start is not None:
+                # KEYS ARE LISTED IN STRING ORDER, SO "10000" SORTS BELOW "9999":
+                # THE NEXT NUMBER OF DIGITS MUST BE LISTED FROM ITS OWN MARKER
+                list_from(prefix, bucket, 10 ** len(text(start)), please_stop)
             Log.note("Cache for {{bucket}} (prefix={{prefix|quote}}) is up to date", bucket=bucket.name, prefix=prefix)
 
         return Thread.run("top up "+self.bucket.name, update, prefix, self.bucket)
 
     def upsert_to_db(self, data):
         """
-        INSERT DATA INTO DATABASE, IGNORE CONSTRAINT ERRORS
-        :param data:
-        :return:
+        INSERT, OR UPDATE, THE GIVEN FILES, KEEPING ANY annotate ALREADY RECORDED
+        :param data: LIST OF {bucket, key, name, last_modified, size, prefix, num} RECORDS
         """
-        try:
-            self.db.query(
-                "INSERT INTO files (bucket, key, name, last_modified, size) " +
-                "\nUNION ALL\n".join(
-                    "SELECT " + ",".join(self.db.quote_value(v) for v in d)
+        columns = ["bucket", "key", "name", "last_modified", "size", "prefix", "num"]
+        with self.db.transaction() as t:
+            t.execute(
+                "INSERT OR REPLACE INTO files (" + ",".join(quote_column(c).sql for c in columns) + ", annotate) VALUES\n" +
+                ",\n".join(
+                    "(" +
+                    ",".join(quote_value(d[c]).sql for c in columns) +
+                    ", (SELECT annotate FROM files WHERE bucket=" + quote_value(d["bucket"]).sql +
+                    " AND name=" + quote_value(d["name"]).sql + "))"
                     for d in data
                 )
             )
-        except Exception as e:
-            if "UNIQUE constraint failed" in e:
-                if len(data) == 1:
-                    return  # TODO: P
-                else:
-                    split = int(round(len(data)/2, 0))
-                    self.upsert_to_db(data[:split])
-                    self.upsert_to_db(data[split:])
-            else:
-                Log.warning("Do not know what to do", cause=e)
-
-
-
 
+    def get_nums(self, prefix, min_num=None, max_num=None):
+        """
+        :param prefix: "tc", "bb", OR "" (FOR BUCKETS WITHOUT A PREFIX)
+        :param min_num: SMALLEST num TO INCLUDE
+        :param max_num: LARGEST num TO INCLUDE
+        :return: set OF THE num IN THE INVENTORY
+        """
+        where = [
+            "bucket=" + quote_value(self.bucket.name).sql,
+            "prefix=" + quote_value(prefix).sql
+        ]
+        if min_num is not None:
+            where.append("num>=" + quote_value(min_num).sql)
+        if max_num is not None:
+            where.append("num<=" + quote_value(max_num).sql)
+        result = self.db.query("SELECT DISTINCT num FROM files WHERE " + " AND ".join(where))
+        return set(d[0] for d in result.data)
+
+
+def _selector(prefix, suffix):
+    """
+    :return: SQL EXPRESSION FOR THE num OF THE name COLUMN
+    """
+    if prefix:
+        start = text(len(prefix) + 2)
+        return "cast(substr(name, " + start + ", instr(substr(name, " + start + "), " + suffix + ") - 1) as decimal)"
+    else:
+        return "cast(substr(name, 1, instr(name, " + suffix + ") - 1) as decimal)"
+
+
+def _prefix_filter(prefix):
+    if prefix:
+        return "substr(name, 1, " + text(len(prefix) + 1) + ")=" + quote_value(prefix + ".").sql
+    else:
+        return "1=1"
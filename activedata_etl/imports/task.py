@@ -9,8 +9,9 @@ from __future__ import division, unicode_literals
 from activedata_etl.transforms.perfherder_logs_to_perf_logs import (
     KNOWN_PERFHERDER_TESTS,
 )
-from mo_dots import Data, coalesce, set_default, unwrap, is_data
+from mo_dots import coalesce, set_default, unwrap, is_data
 from mo_future import text
+from mo_json import value2json
 from mo_hg.hg_mozilla_org import minimize_repo
 from mo_logs import Log, strings
 from mo_logs.strings import between
@@ -53,20 +54,18 @@ def decode_metatdata_name(source_key, name):
     if name.startswith(NULL_TASKS):
         return {}
 
-    for category, patterns in COMPILED_CATEGORIES.items():
+    for category, matcher in COMPILED_CATEGORIES.items():
         if name.startswith(category):
-            for p, v in patterns:
-                result = p.match(name[len(category) :])
-                if result != None:
-                    return set_default(result, v)
-            else:
-                Log.warning(
-                    "{{name|quote}} can not be processed with {{category}} for key {{key}}",
-                    key=source_key,
-                    name=name,
-                    category=category,
-                )
-                break
+            result = matcher.match(name[len(category) :])
+            if result != None:
+                return result
+            Log.warning(
+                "{{name|quote}} can not be processed with {{category}} for key {{key}}",
+                key=source_key,
+                name=name,
+                category=category,
+            )
+            break
     return {}
 
 
@@ -101,43 +100,225 @@ NULL_TASKS = (
 )
 
 
-class Matcher(object):
-    def __init__(self, pattern):
-        if pattern.startswith("{{"):
-            var_name = strings.between(pattern, "{{", "}}")
-            self.pattern = globals()[var_name]
+class Lookup(object):
+    """
+    THE KEYS OF ONE {{VAR}} DICT, AS A CHARACTER TRIE, SO ALL KEYS THAT
+    PREFIX name ARE FOUND IN ONE WALK, RATHER THAN ONE startswith() PER KEY.
+    THE LONGEST KEY IS TRIED FIRST, SO THE ORDER DOES NOT DEPEND ON DICT ORDER
+    """
+
+    def __init__(self, var_name):
+        self.var_name = var_name
+        self.trie = {}  # MAP FROM CHARACTER TO SUB-TRIE; THE "" KEY HOLDS (length, value) OF A KEY ENDING HERE
+        self.functions = []  # FUNCTIONS THAT MATCH A NAME, LIKE match_tp6
+        for k, v in globals()[var_name].items():
+            if is_data(v):
+                node = self.trie
+                for c in k:
+                    node = node.setdefault(c, {})
+                node[""] = (len(k), v)
+            else:
+                self.functions.append(v)
+        self.functions.sort(key=lambda f: f.__name__)
+
+    def matches(self, name, start):
+        """
+        :return: LIST OF (length, value), LONGEST FIRST, FOR THE KEYS THAT PREFIX name[start:]
+        """
+        node = self.trie
+        found = []
+        if "" in node:
+            found.append(node[""])
+        for i in range(start, len(name)):
+            node = node.get(name[i])
+            if node is None:
+                break
+            if "" in node:
+                found.append(node[""])
+        found.reverse()
+
+        if self.functions:
+            remainder = name[start:]
+            for f in self.functions:
+                l, v = f(remainder)
+                if v is not None:
+                    found.append((l, v))
+            # STABLE, SO KEYS COME BEFORE FUNCTIONS OF THE SAME LENGTH
+            found.sort(key=lambda f: -f[0])
+        return found
+
+
+class Node(object):
+    """
+    ONE TOKEN (A LITERAL, OR A {{VAR}}) IN THE TRIE OF A CATEGORY'S PATTERNS
+    """
+
+    __slots__ = ["literal", "lookup", "index", "first", "children"]
+
+    def __init__(self, token):
+        if token.startswith("{{"):
             self.literal = None
-            remainder = pattern[len(var_name) + 4 :]
+            self.lookup = _lookup(token[2:-2])
         else:
-            self.pattern = None
-            self.literal = coalesce(strings.between(pattern, None, "{{"), pattern)
-            remainder = pattern[len(self.literal) :]
+            self.literal = token
+            self.lookup = None
+        self.index = INFINITY  # ORDER OF THE PATTERN THAT ENDS HERE
+        self.first = INFINITY  # SMALLEST index IN THIS SUB-TRIE
+        self.children = []
 
-        if remainder:
-            self.child = Matcher(remainder)
-        else:
-            self.child = Data(match=lambda name: None if name else {})
 
-    def match(self, name):
-        if self.pattern:
-            for k, v in self.pattern.items():
-                if is_data(v):
-                    # TODO: CONVERT THESE PREFIX MATCHES TO SHORT NAME PULLERS
-                    if name.startswith(k):
-                        match = self.child.match(name[len(k) :])
-                        if match is not None:
-                            return set_default(match, v)
+class CategoryMatcher(object):
+    """
+    ALL PATTERNS OF ONE CATEGORY, COMPILED INTO ONE TRIE OF TOKENS, SO THE
+    PATTERNS SHARING A PREFIX (eg "{{TEST_PLATFORM}}/{{BUILD_TYPE}}-") MATCH IT
+    ONCE.  THE RESULT IS THE SAME AS TRYING EACH PATTERN IN ORDER: THE FIRST
+    PATTERN THAT MATCHES WINS, AND EACH {{VAR}} TRIES ITS LONGEST KEY FIRST.
+    SUB-TRIES THAT CAN ONLY FIND A LATER PATTERN THAN THE BEST SO FAR ARE SKIPPED.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns.keys())
+        self.values = list(patterns.values())
+        self.root = Node("")
+        for index, pattern in enumerate(self.patterns):
+            node = self.root
+            node.first = min(node.first, index)
+            for token in _tokens(pattern):
+                for child in node.children:
+                    if child.literal == token or (child.lookup and "{{" + child.lookup.var_name + "}}" == token):
+                        node = child
+                        break
                 else:
-                    l, v = v(name)
-                    if v is not None:
-                        match = self.child.match(name[l:])
-                        if match is not None:
-                            return set_default(match, v)
+                    child = Node(token)
+                    node.children.append(child)
+                    node = child
+                node.first = min(node.first, index)
+            node.index = index
+        _sort_children(self.root)
+
+    def match(self, name):
+        """
+        :return: DECODED PROPERTIES OF name, OR None IF NO PATTERN MATCHES
+        """
+        search = _Search(name, find_all=False)
+        search.search(self.root.children, 0)
+        if search.best_values is None:
+            return None
+        return self._result(search.best_index, search.best_values)
+
+    def match_all(self, name):
+        """
+        :return: LIST OF (pattern, result) FOR EVERY PATTERN THAT MATCHES name, IN ORDER
+        """
+        search = _Search(name, find_all=True)
+        search.search(self.root.children, 0)
+        return [
+            (self.patterns[i], self._result(i, search.found[i]))
+            for i in sorted(search.found.keys())
+        ]
+
+    def _result(self, index, values):
+        result = {}
+        for v in reversed(values):
+            result = set_default(result, v)
+        return set_default(result, self.values[index])
+
+
+class _Search(object):
+    __slots__ = ["name", "path", "best_index", "best_values", "found"]
+
+    def __init__(self, name, find_all):
+        self.name = name
+        self.path = []  # VALUES OF THE {{VAR}} KEYS MATCHED SO FAR
+        self.best_index = INFINITY
+        self.best_values = None
+        self.found = {} if find_all else None  # MAP FROM PATTERN INDEX TO VALUES, WHEN FINDING ALL
+
+    def search(self, nodes, start):
+        name = self.name
+        for node in nodes:
+            if node.first >= self.best_index:
+                break  # CHILDREN ARE SORTED BY first
+            if node.lookup is None:
+                if name.startswith(node.literal, start):
+                    self.step(node, start + len(node.literal))
+            else:
+                for length, value in node.lookup.matches(name, start):
+                    self.path.append(value)
+                    self.step(node, start + length)
+                    self.path.pop()
+                    if node.first >= self.best_index:
+                        break
+
+    def step(self, node, end):
+        if end == len(self.name) and node.index < self.best_index:
+            if self.found is None:
+                self.best_index = node.index
+                self.best_values = list(self.path)
+            elif node.index not in self.found:
+                self.found[node.index] = list(self.path)
+        if node.children:
+            self.search(node.children, end)
 
-        elif self.literal:
-            if name.startswith(self.literal):
-                return self.child.match(name[len(self.literal) :])
-        return None
+
+INFINITY = float("inf")
+_lookups = {}  # MAP FROM VAR NAME TO Lookup, SHARED BY ALL CATEGORIES
+
+
+def _lookup(var_name):
+    lookup = _lookups.get(var_name)
+    if lookup is None:
+        lookup = _lookups[var_name] = Lookup(var_name)
+    return lookup
+
+
+def _tokens(pattern):
+    """
+    SPLIT PATTERN INTO LITERALS AND {{VAR}}
+    """
+    while pattern:
+        if pattern.startswith("{{"):
+            token = pattern[: pattern.index("}}") + 2]
+        else:
+            token = coalesce(strings.between(pattern, None, "{{"), pattern)
+        yield token
+        pattern = pattern[len(token) :]
+
+
+def _sort_children(node):
+    node.children.sort(key=lambda c: c.first)
+    for c in node.children:
+        _sort_children(c)
+
+
+def pattern_report(names):
+    """
+    FOR MAINTAINING CATEGORIES, USING A SAMPLE OF TASK names
+    :return: {
+        "ambiguous": MAP FROM name TO THE PATTERNS THAT MATCH IT WITH DIFFERENT RESULTS,
+        "unreachable": PATTERNS THAT ARE NOT THE FIRST MATCH FOR ANY OF names
+    }
+    """
+    ambiguous = {}
+    used = set()
+    for name in names:
+        for category, matcher in COMPILED_CATEGORIES.items():
+            if name.startswith(category):
+                matches = matcher.match_all(name[len(category) :])
+                if matches:
+                    used.add((category, matches[0][0]))
+                    if len(set(value2json(r) for _, r in matches)) > 1:
+                        ambiguous[name] = [category + p for p, _ in matches]
+                break
+
+    unreachable = [
+        c + p
+        for c, m in COMPILED_CATEGORIES.items()
+        for p in m.patterns
+        if (c, p) not in used
+    ]
+
+    return {"ambiguous": ambiguous, "unreachable": unreachable}
 
 
 CATEGORIES = {
@@ -835,6 +1016,4 @@ SPECIAL_TESTS ={
     "unit-browser-engine-gecko-nightly":{}
 }
 
-COMPILED_CATEGORIES = {
-    c: [(Matcher(k), v) for k, v in p.items()] for c, p in CATEGORIES.items()
-}
+COMPILED_CATEGORIES = {c: CategoryMatcher(p) for c, p in CATEGORIES.items()}
@@ -192,6 +192,8 @@ def process_tc_live_backing_log(source_key, all_log_lines, from_url, task_record
 
             continue
 
+        if line_type(curr_line) != NEW_HARNESS:
+            continue
         mozharness_says = new_mozharness_line.match(from_url, end_time, curr_line)
         if mozharness_says:
             timestamp, mode, result, harness_step_name = mozharness_says
@@ -312,6 +314,7 @@ def process_text_log(all_log_lines, from_url, source_key):
         if not curr_line:
             continue
 
+        curr_type = line_type(curr_line)
         if process_head:
             # builder: mozilla-inbound_ubuntu32_vm_test-mochitest-e10s-browser-chrome-3
             # slave: tst-linux32-spot-149
@@ -342,8 +345,11 @@ def process_text_log(all_log_lines, from_url, source_key):
                 if not builder_says:
                     Log.warning("Log header {{log_line|quote}} can not be processed (url={{url}})", log_line=curr_line, url=from_url, cause=e)
                     continue
-        else:
+        elif curr_type == BUILDER:
             builder_says = builder_line.match(start_time, curr_line, next_line)
+        else:
+            builder_line.skip()
+            builder_says = None
 
         if builder_says:
             process_head = False
@@ -379,7 +385,10 @@ def process_text_log(all_log_lines, from_url, source_key):
             continue
 
 
-        mozharness_says = new_mozharness_line.match(from_url, end_time, curr_line)
+        if curr_type == NEW_HARNESS:
+            mozharness_says = new_mozharness_line.match(from_url, end_time, curr_line)
+        else:
+            mozharness_says = None
         if mozharness_says:
             timestamp, mode, result, harness_step_name = mozharness_says
             end_time = MAX([end_time, timestamp])
@@ -396,7 +405,10 @@ def process_text_log(all_log_lines, from_url, source_key):
                 harness_step['result'] = result
                 harness_step['end_time'] = timestamp
 
-        mozharness_says = old_mozharness_line.match(from_url, end_time, prev_line, curr_line, next_line)
+        if curr_type == OLD_HARNESS:
+            mozharness_says = old_mozharness_line.match(from_url, end_time, prev_line, curr_line, next_line)
+        else:
+            mozharness_says = None
         if mozharness_says:
             timestamp, mode, harness_step_name = mozharness_says
             end_time = MAX([end_time, timestamp])
@@ -448,6 +460,26 @@ def process_text_log(all_log_lines, from_url, source_key):
 
 
 
+# ONE match() TELLS WHICH PARSER, IF ANY, CAN USE A LINE; MOST LINES ARE NONE OF THEM
+NEW_HARNESS = "new_harness"  # NewHarnessLines
+OLD_HARNESS = "old_harness"  # OldHarnessLines
+BUILDER = "builder"  # BuilderLines
+LINE_TYPES = re.compile(
+    r"\d\d:\d\d:\d\d     INFO - (?:(?P<new_harness>\[mozharness\: )|(?P<old_harness>#####))"
+    r"|(?P<builder>========= |elapsedTime=)"
+)
+
+
+def line_type(line):
+    """
+    :return: NEW_HARNESS, OLD_HARNESS, BUILDER, OR None IF NO PARSER CAN MATCH line
+    """
+    match = LINE_TYPES.match(line)
+    if match:
+        return match.lastgroup
+    return None
+
+
 NEW_MOZLOG_STEP = re.compile(r"\d\d:\d\d:\d\d     INFO - \[mozharness\: (.*)Z\] .*")
 NEW_MOZLOG_START_STEP = re.compile(r"\d\d:\d\d:\d\d     INFO - \[mozharness\: (.*)Z\] (Running|Skipping) (.*) step.")
 NEW_MOZLOG_END_STEP = [
@@ -604,6 +636,12 @@ class BuilderLines(object):
         self.last_elapse_time = None
         self.last_elapse_time_age = 0  # KEEP TRACK OF HOW MANY LINES AGO WE SAW elapsedTime
 
+    def skip(self):
+        """
+        SAME AS match() OF A LINE THAT IS NOT A BUILDER LINE
+        """
+        self.last_elapse_time_age += 1
+
     def match(self, start_time, line, next_line):
         """
         RETURN (timestamp, elapsed, message, done, status) QUADRUPLE
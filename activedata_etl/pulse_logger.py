@@ -9,25 +9,31 @@
 from __future__ import division
 from __future__ import unicode_literals
 
+from time import time
+
 from mo_future import text
 from activedata_etl.synchro import SynchState, SYNCHRONIZATION_KEY
 from mo_dots import set_default, coalesce, listwrap
 from pyLibrary import aws
 from mo_json import json2value, value2json
-from pyLibrary.collections import MAX, MIN
-from pyLibrary.collections.persistent_queue import PersistentQueue
+from mo_math import MAX
+from mo_collections.persistent_queue import PersistentQueue
 from mo_logs import startup, constants
 from mo_logs.exceptions import Except
 from mo_logs import Log
 from pyLibrary.env import pulse
-from jx_python import jx
-from mo_threads import Thread, MAIN_THREAD
+from mo_threads import Thread, MAIN_THREAD, THREAD_STOP
+from mo_times import Duration
 from mo_times.dates import Date
 
 
 # ONLY DEPLOY OFF THE pulse-logger BRANCH
 
 
+MAX_BYTES = 10 * 1000 * 1000  # FLUSH A BLOCK WHEN IT HAS THIS MANY BYTES OF JSON
+MAX_AGE = 60  # FLUSH A BLOCK THIS MANY SECONDS AFTER ITS FIRST MESSAGE
+
+
 def log_loop(settings, synch, queue, bucket, please_stop):
     queue_name = coalesce(settings.work_queue, settings.notify)
     if queue_name:
@@ -35,54 +41,31 @@ def log_loop(settings, synch, queue, bucket, please_stop):
     else:
         work_queue = None
 
+    max_age = Duration(coalesce(settings.param.max_age, MAX_AGE)).seconds
     try:
-        for i, g in jx.chunk(queue, size=settings.param.size):
+        while not please_stop:
+            first = queue.pop(timeout=max_age)
+            if first is THREAD_STOP:
+                break
+            elif first is None:
+                continue
+
+            block = Block(settings, synch, first)
             Log.note(
-                "Preparing {{num}} pulse messages to bucket={{bucket}}",
-                num=len(g),
-                bucket=bucket.name
+                "Streaming pulse messages to bucket={{bucket}}, key={{key}}",
+                bucket=bucket.name,
+                key=block.key
             )
-
-            if settings.destination.key_prefix:
-                full_key = settings.destination.key_prefix + "." + text(synch.next_key) + ":" + text(MIN(g.get("_meta.count")))
-            else:
-                full_key = text(synch.next_key) + ":" + text(MIN(g.get("_meta.count")))
             try:
-                output = [
-                    set_default(
-                        d,
-                        {"etl": {
-                            "name": "Pulse block",
-                            "bucket": settings.destination.bucket,
-                            "timestamp": Date.now().unix,
-                            "id": synch.next_key,
-                            "source": {
-                                "name": coalesce(*settings.source.name),
-                                "exchange": d._meta.exchange,
-                                "id": d._meta.count,
-                                "count": d._meta.count,
-                                "message_id": d._meta.message_id,
-                                "sent": Date(d._meta.sent),
-                                "source": {
-                                    "id": settings.destination.key_prefix
-                                },
-                                "type": "join"
-                            },
-                            "type": "aggregation"
-                        }}
-                    )
-                    for i, d in enumerate(g)
-                    if d != None  # HAPPENS WHEN PERSISTENT QUEUE FAILS TO LOG start
-                ]
-                bucket.write(full_key, "\n".join(value2json(d) for d in output))
+                bucket.write_lines(block.key, block.lines(queue))
                 synch.advance()
-                synch.source_key = MAX(g.get("_meta.count")) + 1
+                synch.source_key = block.max_count + 1
 
                 now = Date.now()
                 if work_queue != None:
                     work_queue.add({
                         "bucket": bucket.name,
-                        "key": full_key,
+                        "key": block.key,
                         "timestamp": now.unix,
                         "date/time": now.format()
                     })
@@ -91,16 +74,16 @@ def log_loop(settings, synch, queue, bucket, please_stop):
                 queue.commit()
                 Log.note(
                     "Wrote {{num}} pulse messages to bucket={{bucket}}, key={{key}} ",
-                    num=len(g),
+                    num=block.count,
                     bucket=bucket.name,
-                    key=full_key
+                    key=block.key
                 )
             except Exception as e:
                 queue.rollback()
                 if not queue.closed:
-                    Log.warning("Problem writing {{key}} to S3", key=full_key, cause=e)
+                    Log.warning("Problem writing {{key}} to S3", key=block.key, cause=e)
 
-            if please_stop:
+            if please_stop or block.stopped:
                 break
     except Exception as e:
         Log.warning("Problem in the log loop", cause=e)
@@ -110,6 +93,95 @@ def log_loop(settings, synch, queue, bucket, please_stop):
     Log.note("log_loop() IS DONE")
 
 
+class Block(object):
+    """
+    THE MESSAGES OF ONE S3 KEY, STREAMED WITH THEIR ETL HEADERS, UNTIL THE
+    BLOCK IS FULL (param.size MESSAGES, OR param.max_bytes), OR OLD (param.max_age)
+    """
+
+    def __init__(self, settings, synch, first):
+        self.first = first
+        self.max_size = settings.param.size
+        self.max_bytes = coalesce(settings.param.max_bytes, MAX_BYTES)
+        self.deadline = time() + Duration(coalesce(settings.param.max_age, MAX_AGE)).seconds
+        self.count = 0
+        self.bytes = 0
+        self.max_count = first._meta.count
+        self.stopped = False  # True IF THE QUEUE WAS STOPPED
+        self.settings = settings
+
+        # _meta.count IS ASSIGNED IN QUEUE ORDER, SO THE FIRST IS THE MINIMUM
+        if settings.destination.key_prefix:
+            self.key = settings.destination.key_prefix + "." + text(synch.next_key) + ":" + text(first._meta.count)
+        else:
+            self.key = text(synch.next_key) + ":" + text(first._meta.count)
+
+        # THE HEADER IS THE SAME FOR ALL MESSAGES, EXCEPT FOR etl.source
+        self.etl = {
+            "name": "Pulse block",
+            "bucket": settings.destination.bucket,
+            "timestamp": Date.now().unix,
+            "id": synch.next_key,
+            "source": SOURCE,
+            "type": "aggregation"
+        }
+        prefix, suffix = value2json(self.etl).split(value2json(SOURCE))
+        self.prefix = '"etl":' + prefix
+        self.suffix = suffix + "}"
+        self.source_name = coalesce(*settings.source.name)
+
+    def lines(self, queue):
+        """
+        GENERATE THE JSON LINES, POPPING MORE MESSAGES FROM queue AS NEEDED
+        """
+        d = self.first
+        while True:
+            if d != None:  # HAPPENS WHEN PERSISTENT QUEUE FAILS TO LOG start
+                line = self._encode(d)
+                self.count += 1
+                self.bytes += len(line)
+                self.max_count = MAX([self.max_count, d._meta.count])
+                yield line
+
+            if self.count >= self.max_size or self.bytes >= self.max_bytes:
+                return
+            d = queue.pop(timeout=max(0, self.deadline - time()))
+            if d is THREAD_STOP:
+                self.stopped = True
+                return
+            elif d is None:
+                return
+
+    def _encode(self, d):
+        if d.etl != None:
+            # NOT EXPECTED, BUT KEEP WHAT THE MESSAGE HAS
+            return value2json(set_default(d, {"etl": dict(self.etl, source=self._source(d))}))
+
+        json = value2json(d)
+        return (
+            json[:-1] +
+            ("," if len(json) > 2 else "") +
+            self.prefix + value2json(self._source(d)) + self.suffix
+        )
+
+    def _source(self, d):
+        return {
+            "name": self.source_name,
+            "exchange": d._meta.exchange,
+            "id": d._meta.count,
+            "count": d._meta.count,
+            "message_id": d._meta.message_id,
+            "sent": Date(d._meta.sent),
+            "source": {
+                "id": self.settings.destination.key_prefix
+            },
+            "type": "join"
+        }
+
+
+SOURCE = "{{source}}"  # PLACEHOLDER IN THE ENCODED HEADER
+
+
 def main():
     try:
         settings = startup.read_settings()
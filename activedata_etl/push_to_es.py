@@ -30,17 +30,7 @@ empty_bucket_complaint_sent = False
 def splitter(work_queue, please_stop):
     global empty_bucket_complaint_sent
 
-    for pair in iter(work_queue.pop_message, ""):
-        if please_stop:
-            for k, v in split.items():
-                v.add(THREAD_STOP)
-            return
-        if pair == None:
-            # ADD BACKFILLING HERE
-            (Till(seconds=5) | please_stop).wait()
-            continue
-
-        message, payload = pair
+    for message, payload in _pop_all(work_queue, please_stop):
         if not is_data(payload):
             Log.error("Not expecting a Data payload with `key` and `bucket` properties")
 
@@ -95,6 +85,30 @@ def splitter(work_queue, please_stop):
             )
 
 
+def _pop_all(work_queue, please_stop):
+    """
+    GENERATE (message, payload) PAIRS, READ FROM work_queue IN BATCHES
+    """
+    while True:
+        if please_stop:
+            for k, v in split.items():
+                v.add(THREAD_STOP)
+            if hasattr(work_queue, "flush"):
+                work_queue.flush()
+            return
+        if hasattr(work_queue, "pop_messages"):
+            pairs = work_queue.pop_messages()
+        else:
+            pair = work_queue.pop_message(till=Till(seconds=1))
+            pairs = [pair] if pair and pair[1] != None else []
+        if not pairs:
+            # ADD BACKFILLING HERE
+            (Till(seconds=5) | please_stop).wait()
+            continue
+        for pair in pairs:
+            yield pair
+
+
 def safe_splitter(work_queue, please_stop):
     while not please_stop:
         try:
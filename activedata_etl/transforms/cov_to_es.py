@@ -18,6 +18,7 @@ from activedata_etl.transforms.jsvm_to_es import process_jsvm_artifact
 from activedata_etl.transforms.per_test_to_es import process_per_test_artifact
 from mo_json import json2value
 from mo_logs import Log, Except
+from mo_threads import Signal, Thread
 
 DEBUG = True
 
@@ -30,121 +31,142 @@ def process(source_key, source, destination, resources, please_stop=None):
     :param source_key: The key of the file containing the pulse messages in the source pulse message bucket
     :param source: The source pulse messages, in a batch of (usually) 100
     :param destination: The destination for the transformed data
-    :param resources: not used
+    :param resources: file_mapper, tuid_mapper, AND OPTIONAL coverage_pool TO PROCESS THE ARTIFACTS IN OTHER PROCESSES
     :param please_stop: The stop signal to stop the current thread
     :return: The list of keys of files in the destination bucket
     """
     keys = []
     coverage_artifact_exists = False
+    pool = resources.coverage_pool
+    pending = []  # (artifact, thread) PAIRS FOR THE ARTIFACTS SENT TO THE pool
+
+    def dispatch(kind, process_artifact, task_cluster_record, artifact, artifact_etl):
+        """
+        PROCESS THE ARTIFACT HERE, OR START IT ON THE coverage_pool
+        :return: THE KEYS WRITTEN ([] IF THEY WILL BE FOUND IN pending)
+        """
+        if not pool:
+            return process_artifact(
+                source_key=source_key,
+                resources=resources,
+                destination=destination,
+                task_cluster_record=task_cluster_record,
+                artifact=artifact,
+                artifact_etl=artifact_etl,
+                please_stop=please_stop
+            )
+        # ITS OWN SIGNAL, SO ONE ARTIFACT CAN BE STOPPED WITHOUT STOPPING THE WORKER
+        stop = Signal("stop coverage " + artifact.url)
+        if please_stop is not None:
+            please_stop.then(stop.go)
+        pending.append((artifact, Thread.run(
+            "coverage " + artifact.url,
+            pool.process_artifact,
+            kind,
+            source_key,
+            destination,
+            task_cluster_record,
+            artifact,
+            artifact_etl,
+            please_stop=stop
+        )))
+        return []
+
+    try:
+        for msg_line_index, msg_line in enumerate(list(source.read_lines())):
+            if please_stop:
+                Log.error("Shutdown detected. Stopping job ETL.")
 
-    for msg_line_index, msg_line in enumerate(list(source.read_lines())):
-        if please_stop:
-            Log.error("Shutdown detected. Stopping job ETL.")
-
-        try:
-            task_cluster_record = json2value(msg_line)
-        except Exception as e:
-            if "JSON string is only whitespace" in e:
-                continue
-            else:
-                Log.error("unexpected JSON decoding problem", cause=e)
-
-        parent_etl = task_cluster_record.etl
-        artifacts = task_cluster_record.task.artifacts
-        minimize_task(task_cluster_record)
-
-        etl_header_gen = EtlHeadGenerator(source_key)
-
-        if any(  # if we will be processing coverage, then prepare the resources
-            a in artifact.name
-            for artifact in artifacts
-            for a in ("jsdcov_artifacts.zip", "code-coverage-grcov.zip", "code-coverage-jsvm.zip", "per-test-coverage-reports.zip")
-        ):
-            if not resources.file_mapper:
-                resources.file_mapper = FileMapper(source_key, task_cluster_record)
-
-        for artifact in artifacts:
             try:
-                if "jsdcov_artifacts.zip" in artifact.name:
-                    pass
-                    coverage_artifact_exists = True
-                    _, artifact_etl = etl_header_gen.next(source_etl=parent_etl, url=artifact.url)
-                    if DEBUG:
-                        Log.note("Processing jsdcov artifact: {{url}} for key {{key}}", key=source_key, url=artifact.url)
-
-                    keys.extend(process_jsdcov_artifact(
-                        source_key,
-                        resources,
-                        destination,
-                        task_cluster_record,
-                        artifact,
-                        artifact_etl,
-                        please_stop
-                    ))
-                elif "code-coverage-grcov.zip" in artifact.name:
-                    pass
-                    if not task_cluster_record.repo.push.date:
-                        Log.warning("expecting a repo.push.date for all tasks source_key={{key}}", key=source_key)
-                        continue
-
-                    coverage_artifact_exists = True
-                    _, artifact_etl = etl_header_gen.next(source_etl=parent_etl, url=artifact.url)
-                    if DEBUG:
-                        Log.note("Processing grcov artifact: {{url}} for key {{key}}", key=source_key, url=artifact.url)
-
-                    keys.extend(process_grcov_artifact(
-                        source_key,
-                        resources,
-                        destination,
-                        artifact,
-                        task_cluster_record,
-                        artifact_etl,
-                        please_stop
-                    ))
-                elif "code-coverage-jsvm.zip" in artifact.name:
-                    if not task_cluster_record.repo.push.date:
-                        Log.warning("expecting a repo.push.date for all tasks source_key={{key}}", key=source_key)
-                        continue
-
-                    coverage_artifact_exists = True
-                    _, artifact_etl = etl_header_gen.next(source_etl=parent_etl, url=artifact.url)
-                    if DEBUG:
-                        Log.note("Processing jsvm artifact: {{url}} for key {{key}}", key=source_key, url=artifact.url)
-
-                    keys.extend(process_jsvm_artifact(
-                        source_key,
-                        resources,
-                        destination,
-                        artifact,
-                        task_cluster_record,
-                        artifact_etl,
-                        please_stop
-                    ))
-                elif "per-test-coverage-reports.zip" in artifact.name:
-                    try:
-                        Log.note("start per-test for {{url}}", url=artifact.url)
+                task_cluster_record = json2value(msg_line)
+            except Exception as e:
+                if "JSON string is only whitespace" in e:
+                    continue
+                else:
+                    Log.error("unexpected JSON decoding problem", cause=e)
+
+            parent_etl = task_cluster_record.etl
+            artifacts = task_cluster_record.task.artifacts
+            minimize_task(task_cluster_record)
+
+            etl_header_gen = EtlHeadGenerator(source_key)
+
+            if not pool and any(  # if we will be processing coverage, then prepare the resources
+                a in artifact.name
+                for artifact in artifacts
+                for a in ("jsdcov_artifacts.zip", "code-coverage-grcov.zip", "code-coverage-jsvm.zip", "per-test-coverage-reports.zip")
+            ):
+                if not resources.file_mapper:
+                    resources.file_mapper = FileMapper(source_key, task_cluster_record)
+
+            for artifact in artifacts:
+                try:
+                    if "jsdcov_artifacts.zip" in artifact.name:
+                        pass
                         coverage_artifact_exists = True
                         _, artifact_etl = etl_header_gen.next(source_etl=parent_etl, url=artifact.url)
                         if DEBUG:
-                            Log.note("Processing per-test artifact: {{url}} for key {{key}}", key=source_key, url=artifact.url)
-
-                        keys.extend(process_per_test_artifact(
-                            source_key,
-                            resources,
-                            destination,
-                            task_cluster_record,
-                            artifact,
-                            artifact_etl,
-                            please_stop
-                        ))
-                    finally:
-                        Log.note("done per-test for {{url}}", url=artifact.url)
+                            Log.note("Processing jsdcov artifact: {{url}} for key {{key}}", key=source_key, url=artifact.url)
+
+                        keys.extend(dispatch("jsdcov", process_jsdcov_artifact, task_cluster_record, artifact, artifact_etl))
+                    elif "code-coverage-grcov.zip" in artifact.name:
+                        pass
+                        if not task_cluster_record.repo.push.date:
+                            Log.warning("expecting a repo.push.date for all tasks source_key={{key}}", key=source_key)
+                            continue
+
+                        coverage_artifact_exists = True
+                        _, artifact_etl = etl_header_gen.next(source_etl=parent_etl, url=artifact.url)
+                        if DEBUG:
+                            Log.note("Processing grcov artifact: {{url}} for key {{key}}", key=source_key, url=artifact.url)
+
+                        keys.extend(dispatch("grcov", process_grcov_artifact, task_cluster_record, artifact, artifact_etl))
+                    elif "code-coverage-jsvm.zip" in artifact.name:
+                        if not task_cluster_record.repo.push.date:
+                            Log.warning("expecting a repo.push.date for all tasks source_key={{key}}", key=source_key)
+                            continue
 
+                        coverage_artifact_exists = True
+                        _, artifact_etl = etl_header_gen.next(source_etl=parent_etl, url=artifact.url)
+                        if DEBUG:
+                            Log.note("Processing jsvm artifact: {{url}} for key {{key}}", key=source_key, url=artifact.url)
+
+                        keys.extend(dispatch("jsvm", process_jsvm_artifact, task_cluster_record, artifact, artifact_etl))
+                    elif "per-test-coverage-reports.zip" in artifact.name:
+                        try:
+                            Log.note("start per-test for {{url}}", url=artifact.url)
+                            coverage_artifact_exists = True
+                            _, artifact_etl = etl_header_gen.next(source_etl=parent_etl, url=artifact.url)
+                            if DEBUG:
+                                Log.note("Processing per-test artifact: {{url}} for key {{key}}", key=source_key, url=artifact.url)
+
+                            keys.extend(dispatch("per_test", process_per_test_artifact, task_cluster_record, artifact, artifact_etl))
+                        finally:
+                            Log.note("done per-test for {{url}}", url=artifact.url)
+
+                except Exception as e:
+                    e = Except.wrap(e)
+                    reason = "Problem processing coverage: {{url}} for key {{key}}"
+                    Log.warning(reason, url=artifact.url, key=source_key, cause=e)
+                    raise Log.error(TRY_AGAIN_LATER, reason="Problem processing coverage: " + artifact.url + " for key " + source_key, cause=e)
+
+        while pending:
+            artifact, thread = pending.pop(0)
+            try:
+                keys.extend(thread.join())
             except Exception as e:
                 e = Except.wrap(e)
-                reason = "Problem processing coverage: {{url}} for key {{key}}"
-                Log.warning(reason, url=artifact.url, key=source_key, cause=e)
+                Log.warning("Problem processing coverage: {{url}} for key {{key}}", url=artifact.url, key=source_key, cause=e)
                 raise Log.error(TRY_AGAIN_LATER, reason="Problem processing coverage: " + artifact.url + " for key " + source_key, cause=e)
+    finally:
+        # ON FAILURE, DO NOT LEAVE THE REST OF THE ARTIFACTS RUNNING
+        for _, thread in pending:
+            thread.please_stop.go()
+        for artifact, thread in pending:
+            try:
+                thread.join()
+            except Exception as e:
+                Log.warning("Problem stopping coverage: {{url}} for key {{key}}", url=artifact.url, key=source_key, cause=e)
 
     if DEBUG and coverage_artifact_exists:
         Log.note("Done processing coverage artifacts")
@@ -12,12 +12,11 @@ from __future__ import unicode_literals
 from zipfile import ZipFile
 
 from activedata_etl import etl2key
-from activedata_etl.imports.coverage_util import download_file, tuid_batches
+from activedata_etl.imports.coverage_util import RecordEmitter, download_file, tuid_batches
 from activedata_etl.imports.parse_lcov import parse_lcov_coverage
 from mo_dots import set_default
 from mo_files import TempFile
 from mo_future import text
-from mo_json import value2json
 from mo_logs import Log, machine_metadata
 from mo_times import Timer, Date
 from mo_http.big_data import ibytes2ilines
@@ -50,6 +49,7 @@ def process_grcov_artifact(source_key, resources, destination, artifact, task_cl
         },
         task_cluster_record
     )
+    emitter = RecordEmitter(template_record, ["source", "etl.id", "_id"])
     etl_key = etl2key(artifact_etl)
     keys = [etl_key]
 
@@ -84,13 +84,15 @@ def process_grcov_artifact(source_key, resources, destination, artifact, task_cl
                     renamed_files(),
                     path="file"
                 ):
-                    template_record.source = source
-                    template_record.etl.id = count
-                    template_record._id = file_id + "." + text(count)
+                    line = emitter.encode({
+                        "source": source,
+                        "etl": {"id": count},
+                        "_id": file_id + "." + text(count)
+                    })
                     count += 1
                     if DEBUG and (count % 10000 == 0):
-                        Log.note("Processed {{num}} coverage records\n{{example}}", num=count, example=value2json(template_record))
-                    yield value2json(template_record)
+                        Log.note("Processed {{num}} coverage records\n{{example}}", num=count, example=line)
+                    yield line
 
     with TempFile() as tmpfile:
         try:
@@ -12,11 +12,11 @@ from __future__ import unicode_literals
 from zipfile import ZipFile
 
 from activedata_etl import etl2key
-from activedata_etl.imports.coverage_util import download_file, LANGUAGE_MAPPINGS, tuid_batches
+from activedata_etl.imports.coverage_util import RecordEmitter, download_file, LANGUAGE_MAPPINGS, tuid_batches
 from mo_dots import wrap, set_default
 from mo_files import TempFile
 from mo_future import NEXT
-from mo_json import stream, value2json
+from mo_json import stream
 from mo_logs import Log, machine_metadata
 from mo_times.dates import Date
 from mo_times.timer import Timer
@@ -38,31 +38,28 @@ def process_per_test_artifact(source_key, resources, destination, task_cluster_r
             urls_w_uncoverable_lines.add(artifact.url)
             Log.warning("per-test-coverage {{url}} has uncoverable lines", url=artifact.url)
 
-        new_record = set_default(
-            {
-                "source": {
-                    "language": [lang for lang, extensions in LANGUAGE_MAPPINGS if filename.endswith(extensions)],
-                    "file": set_default(
-                        file_details,
-                        {
-                            "covered": sorted(covered),
-                            "uncovered": sorted(uncovered),
-                            "total_covered": len(covered),
-                            "total_uncovered": len(uncovered),
-                            "percentage_covered": len(covered) / coverable_line_count if coverable_line_count else None
-                        }
-                    )
-                },
-                "etl": {
-                    "id": count(),
-                    "source": parent_etl,
-                    "type": "join",
-                    "machine": machine_metadata,
-                    "timestamp": Date.now()
-                }
+        new_record = wrap({
+            "source": {
+                "language": [lang for lang, extensions in LANGUAGE_MAPPINGS if filename.endswith(extensions)],
+                "file": set_default(
+                    file_details,
+                    {
+                        "covered": sorted(covered),
+                        "uncovered": sorted(uncovered),
+                        "total_covered": len(covered),
+                        "total_uncovered": len(uncovered),
+                        "percentage_covered": len(covered) / coverable_line_count if coverable_line_count else None
+                    }
+                )
             },
-            task_cluster_record
-        )
+            "etl": {
+                "id": count(),
+                "source": parent_etl,
+                "type": "join",
+                "machine": machine_metadata,
+                "timestamp": Date.now()
+            }
+        })
 
         return new_record
 
@@ -198,9 +195,10 @@ def process_per_test_artifact(source_key, resources, destination, task_cluster_r
             download_file(artifact.url, temp_file.abspath)
 
         key = etl2key(artifact_etl)
+        emitter = RecordEmitter(task_cluster_record, ["source", "etl", "test", "_id"])
         with Timer("Processing per-test reports for key {{key}}", param={"key": key}):
             destination.write_lines(
-                key, map(value2json, tuid_batches(
+                key, map(emitter.encode, tuid_batches(
                     source_key,
                     task_cluster_record,
                     resources,
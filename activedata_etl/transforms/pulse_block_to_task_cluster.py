@@ -33,6 +33,7 @@ from mo_json import json2value, value2json
 from mo_logs import Log, machine_metadata, strings
 from mo_logs.exceptions import suppress_exception, Except
 from mo_testing.fuzzytestcase import assertAlmostEqual
+from mo_threads import Lock, Signal, Thread
 from mo_times.dates import Date
 from pyLibrary import convert
 from mo_http import http
@@ -40,6 +41,7 @@ from mo_http import http
 DEBUG = False
 DISABLE_LOG_PARSING = False
 MAX_THREADS = 5
+PREFETCH_WINDOW = 100  # NUMBER OF LINES FETCHED AHEAD OF THE ONE BEING NORMALIZED
 
 seen_tasks = {}
 new_seen_tc_properties = set()
@@ -51,30 +53,125 @@ def process(source_key, source, destination, resources, please_stop=None):
 
     lines = list(enumerate(source.read_lines()))
     session = requests.session()
-    for line_number, line in lines:
-        if please_stop:
-            Log.error("Shutdown detected. Stopping early")
-        try:
-            tc_message = json2value(line)
-            task_id = consume(tc_message, "status.taskId")  # context.taskId
-            etl = consume(tc_message, "etl")
-            consume(tc_message, "_meta")
+    prefetch = _Prefetch(lines, session)
+    try:
+        for line_number, line in lines:
+            if please_stop:
+                Log.error("Shutdown detected. Stopping early")
+            try:
+                tc_message = json2value(line)
+                task_id = consume(tc_message, "status.taskId")  # context.taskId
+                etl = consume(tc_message, "etl")
+                consume(tc_message, "_meta")
 
-            Log.note(
-                "{{id}} found (line #{{num}}) for {{key}}",
-                key=source_key,
-                id=task_id,
-                num=line_number,
-                artifact=tc_message.artifact.name,
-            )
-            task_url = strings.expand_template(TC_MAIN_URL, {"task_id": task_id})
-            task = http.get_json(task_url, retry=TC_RETRY, session=session)
-            if task.code == "ResourceNotFound":
                 Log.note(
-                    "Can not find task {{task}} while processing key {{key}}",
+                    "{{id}} found (line #{{num}}) for {{key}}",
                     key=source_key,
-                    task=task_id,
+                    id=task_id,
+                    num=line_number,
+                    artifact=tc_message.artifact.name,
                 )
+                task = prefetch.get(line_number, "task", TC_MAIN_URL, task_id)
+                if task.code == "ResourceNotFound":
+                    Log.note(
+                        "Can not find task {{task}} while processing key {{key}}",
+                        key=source_key,
+                        task=task_id,
+                    )
+                    if not source_etl:
+                        # USE ONE SOURCE ETL, OTHERWISE WE MAKE TOO MANY KEYS
+                        source_etl = etl
+                        if (
+                            not source_etl.source.source
+                        ):  # FIX ONCE TC LOGGER IS USING "tc" PREFIX FOR KEYS
+                            source_etl.source.type = "join"
+                            source_etl.source.source = {"id": "tc"}
+
+                    normalized = Data(
+                        task={"id": task_id},
+                        etl={
+                            "id": line_number,
+                            "source": source_etl,
+                            "type": "join",
+                            "timestamp": Date.now(),
+                            "error": "not found",
+                            "machine": machine_metadata,
+                        },
+                    )
+
+                    output.append(normalized)
+
+                    continue
+
+                # if not tc_message.status.runs.last().resolved:
+                # UPDATE TASK STATUS (tc_message MAY BE OLD)
+                task_status = prefetch.get(line_number, "status", TC_STATUS_URL, task_id)
+                consume(task_status, "status.taskId")
+                temp_runs, task_status.status.runs = (
+                    task_status.status.runs,
+                    Null,
+                )  # set_default() will screw `runs` up
+                set_default(tc_message.status, task_status.status)
+                tc_message.status.runs = [
+                    set_default(r, tc_message.status.runs[ii])
+                    for ii, r in enumerate(temp_runs)
+                ]
+                if not tc_message.status.runs.last().resolved:
+                    Log.error(
+                        TRY_AGAIN_LATER, reason='task still runnning (not "resolved")'
+                    )
+
+                normalized = _normalize(source_key, task_id, tc_message, task, resources)
+
+                # get the artifact list for the taskId
+                try:
+                    artifacts = normalized.task.artifacts = prefetch.get(
+                        line_number, "artifacts", TC_ARTIFACTS_URL, task_id
+                    ).artifacts
+                except Exception as e:
+                    Log.error(
+                        TRY_AGAIN_LATER,
+                        reason="Can not get artifacts for task " + task_id,
+                        cause=e,
+                    )
+
+                for a in artifacts:
+                    a.url = strings.expand_template(
+                        TC_ARTIFACT_URL, {"task_id": task_id, "path": a.name}
+                    )
+                    a.expires = Date(a.expires)
+                    if a.name.endswith("/live_backing.log"):
+                        try:
+                            read_actions(source_key, normalized, a.url)
+                        except Exception as e:
+                            if normalized.task.run.status != "completed":
+                                # THIS IS EXPECTED WHEN THE TASK IS IN AN ERROR STATE, CHECK IT AND IGNORE
+                                pass
+                            elif "DECRYPTION_FAILED_OR_BAD_RECORD_MAC" in e:
+                                # HAPPENS WHEN ETL RUNS BEFORE AWS HAS MACHINE FULLY SETUP
+                                Log.error(TRY_AGAIN_LATER, reason="Unhappy network state", cause=e)
+                            elif "Error -3 while decompressing data: incorrect data check" in e:
+                                # HAPPENS WHEN ETL RUNS BEFORE AWS HAS MACHINE FULLY SETUP
+                                Log.error(TRY_AGAIN_LATER, reason="Unhappy network state", cause=e)
+                            elif TRY_AGAIN_LATER in e:
+                                Log.error(
+                                    "Aborting processing of {{url}} for key={{key}}",
+                                    url=a.url,
+                                    key=source_key,
+                                    cause=e,
+                                )
+                            else:
+                                # THIS IS EXPECTED WHEN THE TASK IS IN AN ERROR STATE, CHECK IT AND IGNORE
+                                Log.error(
+                                    "Problem reading artifact {{url}} for key={{key}}",
+                                    url=a.url,
+                                    key=source_key,
+                                    cause=e,
+                                )
+                    elif a.name.endswith("/resource-usage.json"):
+                        with suppress_exception:
+                            normalized.resource_usage = normalize_resource_usage(a.url)
+                # FIX THE ETL
                 if not source_etl:
                     # USE ONE SOURCE ETL, OTHERWISE WE MAKE TOO MANY KEYS
                     source_etl = etl
@@ -83,148 +180,132 @@ def process(source_key, source, destination, resources, please_stop=None):
                     ):  # FIX ONCE TC LOGGER IS USING "tc" PREFIX FOR KEYS
                         source_etl.source.type = "join"
                         source_etl.source.source = {"id": "tc"}
-
-                normalized = Data(
-                    task={"id": task_id},
-                    etl={
-                        "id": line_number,
-                        "source": source_etl,
-                        "type": "join",
-                        "timestamp": Date.now(),
-                        "error": "not found",
-                        "machine": machine_metadata,
-                    },
-                )
-
-                output.append(normalized)
-
-                continue
-
-            # if not tc_message.status.runs.last().resolved:
-            # UPDATE TASK STATUS (tc_message MAY BE OLD)
-            status_url = strings.expand_template(TC_STATUS_URL, {"task_id": task_id})
-            task_status = http.get_json(status_url, retry=TC_RETRY, session=session)
-            consume(task_status, "status.taskId")
-            temp_runs, task_status.status.runs = (
-                task_status.status.runs,
-                Null,
-            )  # set_default() will screw `runs` up
-            set_default(tc_message.status, task_status.status)
-            tc_message.status.runs = [
-                set_default(r, tc_message.status.runs[ii])
-                for ii, r in enumerate(temp_runs)
-            ]
-            if not tc_message.status.runs.last().resolved:
-                Log.error(
-                    TRY_AGAIN_LATER, reason='task still runnning (not "resolved")'
-                )
-
-            normalized = _normalize(source_key, task_id, tc_message, task, resources)
-
-            # get the artifact list for the taskId
-            try:
-                artifacts = normalized.task.artifacts = http.get_json(
-                    strings.expand_template(TC_ARTIFACTS_URL, {"task_id": task_id}),
-                    retry=TC_RETRY,
-                ).artifacts
-            except Exception as e:
-                Log.error(
-                    TRY_AGAIN_LATER,
-                    reason="Can not get artifacts for task " + task_id,
-                    cause=e,
-                )
-
-            for a in artifacts:
-                a.url = strings.expand_template(
-                    TC_ARTIFACT_URL, {"task_id": task_id, "path": a.name}
-                )
-                a.expires = Date(a.expires)
-                if a.name.endswith("/live_backing.log"):
+                normalized.etl = {
+                    "id": line_number,
+                    "source": source_etl,
+                    "type": "join",
+                    "timestamp": Date.now(),
+                    "machine": machine_metadata,
+                }
+
+                tc_message.artifact = "." if tc_message.artifact else Null
+                if normalized.task.id in seen_tasks:
                     try:
-                        read_actions(source_key, normalized, a.url)
+                        assertAlmostEqual(
+                            [tc_message, task, artifacts],
+                            seen_tasks[normalized.task.id],
+                            places=11,
+                        )
                     except Exception as e:
-                        if normalized.task.run.status != "completed":
-                            # THIS IS EXPECTED WHEN THE TASK IS IN AN ERROR STATE, CHECK IT AND IGNORE
-                            pass
-                        elif "DECRYPTION_FAILED_OR_BAD_RECORD_MAC" in e:
-                            # HAPPENS WHEN ETL RUNS BEFORE AWS HAS MACHINE FULLY SETUP
-                            Log.error(TRY_AGAIN_LATER, reason="Unhappy network state", cause=e)
-                        elif "Error -3 while decompressing data: incorrect data check" in e:
-                            # HAPPENS WHEN ETL RUNS BEFORE AWS HAS MACHINE FULLY SETUP
-                            Log.error(TRY_AGAIN_LATER, reason="Unhappy network state", cause=e)
-                        elif TRY_AGAIN_LATER in e:
-                            Log.error(
-                                "Aborting processing of {{url}} for key={{key}}",
-                                url=a.url,
-                                key=source_key,
-                                cause=e,
-                            )
-                        else:
-                            # THIS IS EXPECTED WHEN THE TASK IS IN AN ERROR STATE, CHECK IT AND IGNORE
-                            Log.error(
-                                "Problem reading artifact {{url}} for key={{key}}",
-                                url=a.url,
-                                key=source_key,
-                                cause=e,
-                            )
-                elif a.name.endswith("/resource-usage.json"):
-                    with suppress_exception:
-                        normalized.resource_usage = normalize_resource_usage(a.url)
-            # FIX THE ETL
-            if not source_etl:
-                # USE ONE SOURCE ETL, OTHERWISE WE MAKE TOO MANY KEYS
-                source_etl = etl
-                if (
-                    not source_etl.source.source
-                ):  # FIX ONCE TC LOGGER IS USING "tc" PREFIX FOR KEYS
-                    source_etl.source.type = "join"
-                    source_etl.source.source = {"id": "tc"}
-            normalized.etl = {
-                "id": line_number,
-                "source": source_etl,
-                "type": "join",
-                "timestamp": Date.now(),
-                "machine": machine_metadata,
-            }
+                        Log.error("Not expected", cause=e)
+                else:
+                    tc_message._meta = Null
+                    tc_message.runs = Null
+                    tc_message.runId = Null
+                    tc_message.artifact = Null
+                    seen_tasks[normalized.task.id] = [tc_message, task, artifacts]
 
-            tc_message.artifact = "." if tc_message.artifact else Null
-            if normalized.task.id in seen_tasks:
-                try:
-                    assertAlmostEqual(
-                        [tc_message, task, artifacts],
-                        seen_tasks[normalized.task.id],
-                        places=11,
+                output.append(normalized)
+            except Exception as e:
+                e = Except.wrap(e)
+                if TRY_AGAIN_LATER in e:
+                    raise e
+                elif mo_math.round(e.params.code, decimal=-2) == 500:
+                    Log.error(
+                        TRY_AGAIN_LATER, reason="error code " + text(e.params.code)
                     )
-                except Exception as e:
-                    Log.error("Not expected", cause=e)
-            else:
-                tc_message._meta = Null
-                tc_message.runs = Null
-                tc_message.runId = Null
-                tc_message.artifact = Null
-                seen_tasks[normalized.task.id] = [tc_message, task, artifacts]
-
-            output.append(normalized)
-        except Exception as e:
-            e = Except.wrap(e)
-            if TRY_AGAIN_LATER in e:
-                raise e
-            elif mo_math.round(e.params.code, decimal=-2) == 500:
-                Log.error(
-                    TRY_AGAIN_LATER, reason="error code " + text(e.params.code)
-                )
-            else:
-                Log.warning(
-                    "TaskCluster line not processed for key {{key}}: {{line|quote}}",
-                    key=source_key,
-                    line=line,
-                    cause=e,
-                )
+                else:
+                    Log.warning(
+                        "TaskCluster line not processed for key {{key}}: {{line|quote}}",
+                        key=source_key,
+                        line=line,
+                        cause=e,
+                    )
+    finally:
+        prefetch.stop()
 
     keys = destination.extend({"id": etl2key(t.etl), "value": t} for t in output)
     return keys
 
 
+class _Prefetch(object):
+    """
+    FETCH THE TASK, STATUS, AND ARTIFACT LIST JSON OF THE LINES, MAX_THREADS
+    AT A TIME, WHILE process() NORMALIZES THE LINES BEFORE THEM.
+    ONLY THE PREFETCH_WINDOW LINES AFTER THE ONE process() IS ON ARE FETCHED
+    """
+
+    def __init__(self, lines, session):
+        """
+        :param lines: LIST OF (line_number, line) PAIRS, line_number COUNTING FROM ZERO
+        """
+        self.session = session
+        self.please_stop = Signal("stop prefetch")
+        self.lines = lines
+        self.locker = Lock("prefetch window")
+        self.next = 0  # line_number OF THE NEXT LINE TO FETCH
+        self.reached = 0  # line_number process() HAS ASKED FOR
+        self.moved = Signal()  # TRIGGERED WHEN reached INCREASES
+        self.fetched = {line_number: (Signal(), {}) for line_number, _ in lines}  # MAP FROM line_number TO (done, {name: value}) PAIR
+        for i in range(min(MAX_THREADS, len(lines))):
+            Thread.run("prefetch tasks " + text(i), self._worker, please_stop=self.please_stop).release()
+
+    def _worker(self, please_stop):
+        while not please_stop:
+            with self.locker:
+                if self.next >= len(self.lines):
+                    break
+                if self.next > self.reached + PREFETCH_WINDOW:
+                    moved = self.moved
+                    line_number = None
+                else:
+                    line_number, line = self.lines[self.next]
+                    self.next += 1
+            if line_number is None:
+                (moved | please_stop).wait()
+                continue
+
+            done, result = self.fetched[line_number]
+            try:
+                task_id = json2value(line).status.taskId
+                task = result["task"] = self._fetch(TC_MAIN_URL, task_id)
+                if task.code == "ResourceNotFound":
+                    continue
+                result["status"] = self._fetch(TC_STATUS_URL, task_id)
+                result["artifacts"] = self._fetch(TC_ARTIFACTS_URL, task_id)
+            except Exception:
+                pass  # process() WILL ASK AGAIN
+            finally:
+                done.go()
+
+    def _fetch(self, template, task_id):
+        url = strings.expand_template(template, {"task_id": task_id})
+        if template == TC_ARTIFACTS_URL:
+            return http.get_json(url, retry=TC_RETRY)
+        return http.get_json(url, retry=TC_RETRY, session=self.session)
+
+    def get(self, line_number, name, template, task_id):
+        """
+        :return: THE PREFETCHED JSON, OR FETCH IT NOW IF THE PREFETCH FAILED
+        """
+        with self.locker:
+            moved = None
+            if line_number > self.reached:
+                self.reached = line_number
+                moved, self.moved = self.moved, Signal()
+        if moved is not None:
+            moved.go()
+
+        done, result = self.fetched[line_number]
+        (done | self.please_stop).wait()
+        if name in result:
+            return result.pop(name)
+        return self._fetch(template, task_id)
+
+    def stop(self):
+        self.please_stop.go()
+
+
 def read_actions(source_key, normalized, url):
     if DISABLE_LOG_PARSING:
         return
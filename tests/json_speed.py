@@ -0,0 +1,40 @@
+# encoding: utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import division
+from __future__ import unicode_literals
+
+from mo_future import utf8_json_encoder
+from mo_json import scrub, value2json
+from mo_logs import Log
+from mo_times import Timer
+
+from tests.test_json_encoder import sample_docs
+
+
+def main():
+    """
+    COMPARE value2json TO THE OLD scrub()-THEN-ENCODE PATH; TAKES A MINUTE
+    """
+    try:
+        Log.start()
+        docs = sample_docs()
+        with Timer("scrub, then encode, {{num}} documents", param={"num": len(docs)}) as old_time:
+            expected = [utf8_json_encoder(scrub(d)) for d in docs]
+        with Timer("value2json {{num}} documents", param={"num": len(docs)}) as new_time:
+            result = [value2json(d) for d in docs]
+
+        if result != expected:
+            Log.error("value2json does not match the old path")
+        Log.note("value2json is {{ratio|round(places=2)}}x faster", ratio=old_time.interval / new_time.interval)
+    finally:
+        Log.stop()
+
+
+if __name__ == "__main__":
+    main()
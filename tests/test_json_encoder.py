@@ -0,0 +1,50 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import division
+from __future__ import unicode_literals
+
+import gzip
+
+from mo_future import utf8_json_encoder
+from mo_json import json2value, scrub, value2json
+from mo_testing.fuzzytestcase import FuzzyTestCase
+from mo_times import Date
+from mo_times.durations import SECOND
+
+
+class TestJsonEncoder(FuzzyTestCase):
+    """
+    value2json MUST EMIT THE SAME AS THE OLD scrub()-THEN-ENCODE PATH
+    FOR TIMING, SEE tests/json_speed.py
+    """
+
+    def test_51586(self):
+        docs = sample_docs(limit=2000)
+        expected = [utf8_json_encoder(scrub(d)) for d in docs]
+        result = [value2json(d) for d in docs]
+        self.assertEqual(result, expected)
+
+
+def sample_docs(limit=None):
+    docs = []
+    with gzip.open("tests/resources/51586_5124145.52.json.gz") as lines:
+        for line in lines:
+            if limit is not None and len(docs) >= limit:
+                break
+            try:
+                doc = json2value(line.decode("utf8"))
+            except Exception:
+                continue
+            # THE mo_dots AND mo_times TYPES FOUND IN THE SINK RECORDS
+            doc.etl = {"id": len(docs), "timestamp": Date.now(), "source": {"id": 0, "timestamp": Date.now()}}
+            doc.result.duration = 3 * SECOND
+            doc.result.lines = list(range(len(docs) % 200))
+            docs.append(doc)
+    return docs
@@ -0,0 +1,82 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import division
+from __future__ import unicode_literals
+
+from mo_dots import wrap
+from mo_logs import Log, SUPPRESSED, exceptions
+from mo_logs.log_usingNothing import StructuredLogger
+from mo_testing.fuzzytestcase import FuzzyTestCase
+
+
+class TestLogFilter(FuzzyTestCase):
+    """
+    LEVEL FILTERING AND RATE LIMITING, SET BY Log.start()
+    """
+
+    def setUp(self):
+        self.logged = []
+
+    def tearDown(self):
+        Log.start({"level": "note", "rate_limit": {}})
+        Log.stop()
+        Log.levels = {}
+
+    def start(self, settings):
+        Log.start(settings)
+        Log.main_log = _Capture(self.logged)
+
+    def test_level(self):
+        self.start({"level": "warning"})
+        Log.note("not logged")
+        Log.alarm("not logged")
+        Log.warning("logged")
+        self.assertEqual([l.template for l in self.logged], ["logged"])
+
+    def test_module_level(self):
+        self.start({"level": "warning", "levels": {__name__: "note"}})
+        Log.note("logged")
+        self.assertEqual([l.template for l in self.logged], ["logged"])
+
+    def test_rate_limit(self):
+        self.start({"rate_limit": {"max": 3, "interval": 60}})
+        for i in range(10):
+            Log.note("repeat {{i}}", i=i)
+        self.assertEqual([l.params.i for l in self.logged], [0, 1, 2])
+
+        Log.stop()
+        self.assertEqual(len(self.logged), 4)
+        report = self.logged[3]
+        self.assertEqual(report.template, SUPPRESSED)
+        self.assertEqual(report.params, {"num": 7, "message": "repeat {{i}}"})
+
+    def test_report_at_suppressed_level(self):
+        # THE REPORT IS NOT FILTERED OUT BY THE level THAT LET THE WARNINGS THROUGH
+        self.start({"level": "warning", "rate_limit": {"max": 2, "interval": 60}})
+        for i in range(5):
+            Log.warning("repeat {{i}}", i=i)
+        self.assertEqual(len(self.logged), 2)
+
+        # END THE WINDOW
+        Log._rates["repeat {{i}}"][0] -= 60
+        Log.warning("repeat {{i}}", i=5)
+
+        self.assertEqual([l.template for l in self.logged], ["repeat {{i}}", "repeat {{i}}", SUPPRESSED, "repeat {{i}}"])
+        report = self.logged[2]
+        self.assertEqual(report.context, exceptions.WARNING)
+        self.assertEqual(report.params.num, 3)
+
+
+class _Capture(StructuredLogger):
+    def __init__(self, logged):
+        self.logged = logged
+
+    def write(self, template, params):
+        self.logged.append(wrap(params))
@@ -0,0 +1,82 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import division
+from __future__ import unicode_literals
+
+import os
+import tempfile
+
+from mo_testing.fuzzytestcase import FuzzyTestCase
+from mo_threads import Thread, Till
+from pyLibrary.meta import cache
+
+
+class TestMetaCache(FuzzyTestCase):
+    def test_lru_eviction(self):
+        calls = []
+
+        @cache(max_size=2)
+        def double(value):
+            calls.append(value)
+            return value * 2
+
+        double(1)
+        double(2)
+        double(1)  # HIT, 1 IS NOW MOST RECENT
+        double(3)  # EVICTS 2
+        double(1)  # HIT
+        double(2)  # MISS
+
+        self.assertEqual(calls, [1, 2, 3, 2])
+        self.assertEqual(double.stats, {"hits": 2, "misses": 4, "evictions": 2})
+
+    def test_single_flight(self):
+        calls = []
+
+        @cache(lock=True)
+        def slow(value):
+            calls.append(value)
+            Till(seconds=0.5).wait()
+            return value
+
+        threads = [Thread.run("slow " + str(i), lambda please_stop: slow(42)) for i in range(5)]
+        for t in threads:
+            t.join()
+
+        self.assertEqual(calls, [42])
+        self.assertEqual(slow.stats, {"hits": 4, "misses": 1})
+
+    def test_failure_is_cached(self):
+        calls = []
+
+        @cache()
+        def fail(value):
+            calls.append(value)
+            raise Exception("expected failure")
+
+        for _ in range(3):
+            self.assertRaises("expected failure", fail, 13)
+        self.assertEqual(len(calls), 1)
+
+    def test_survives_restart(self):
+        filename = os.path.join(tempfile.mkdtemp(), "cache.sqlite")
+        calls = []
+
+        def lookup(value):
+            calls.append(value)
+            return {"value": value}
+
+        first = cache(db=filename)(lookup)
+        self.assertEqual(first(7), {"value": 7})
+
+        # A NEW DECORATOR, WITH AN EMPTY MEMORY, STANDS IN FOR A RESTART
+        second = cache(db=filename)(lookup)
+        self.assertEqual(second(7), {"value": 7})
+        self.assertEqual(calls, [7])
@@ -10,7 +10,7 @@
 from __future__ import division
 from __future__ import unicode_literals
 
-from activedata_etl.imports.task import decode_metatdata_name
+from activedata_etl.imports.task import _lookup, decode_metatdata_name, pattern_report
 from mo_dots import Null, unwrap
 from mo_files import File
 from mo_json import value2json
@@ -72,3 +72,21 @@ class TestMetadataName(FuzzyTestCase):
 
         self.assertEqual(test, expected)
         self.assertEqual(expected, test)
+
+    def test_pattern_report(self):
+        names = File("tests/resources/metadata_names.json").read_json(leaves=False, flexible=False).keys()
+        report = pattern_report(names)
+        Log.note(
+            "{{num}} ambiguous names, and unreachable patterns:\n{{patterns|json}}",
+            num=len(report["ambiguous"]),
+            patterns=report["unreachable"]
+        )
+        self.assertIsInstance(report["unreachable"], list)
+
+    def test_longest_key_first(self):
+        # "debug-fennec" MUST NOT BE SHADOWED BY "debug", WHATEVER THE DICT ORDER
+        lookup = _lookup("BUILD_TYPE")
+        self.assertEqual(
+            [length for length, _ in lookup.matches("debug-fennec-mochitest", 0)],
+            [len("debug-fennec"), len("debug")]
+        )
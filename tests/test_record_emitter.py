@@ -0,0 +1,89 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import division
+from __future__ import unicode_literals
+
+from copy import deepcopy
+
+from activedata_etl.imports.coverage_util import RecordEmitter
+from mo_dots import set_default, unwrap
+from mo_json import json2value, value2json
+from mo_testing.fuzzytestcase import FuzzyTestCase
+from mo_times import Date
+
+
+class TestRecordEmitter(FuzzyTestCase):
+    """
+    RecordEmitter MUST EMIT THE SAME DOCUMENT AS value2json(set_default(record, template))
+    """
+
+    def test_per_test(self):
+        template = task_cluster_record()
+        emitter = RecordEmitter(template, ["source", "etl", "test", "_id"])
+        for count, filename in enumerate(["dom/base/nsDocument.cpp", "js/src/jit/Ion.cpp"]):
+            record = {
+                "source": {
+                    "language": ["c/c++"],
+                    "file": {
+                        "name": filename,
+                        "covered": [1, 2, 5],
+                        "uncovered": [3, 4],
+                        "total_covered": 3,
+                        "total_uncovered": 2,
+                        "percentage_covered": 0.6
+                    }
+                },
+                "etl": {
+                    "id": count,
+                    "source": template["etl"],
+                    "type": "join",
+                    "timestamp": Date("2019-04-01").unix
+                },
+                "test": {"name": "dom/tests/test_" + str(count) + ".html", "suite": "mochitest"},
+                "_id": "tc.123:456.7." + str(count)
+            }
+            self._assert_same(emitter, template, record)
+
+    def test_grcov(self):
+        template = set_default(
+            {
+                "test": {"suite": "mochitest", "chunk": 2},
+                "etl": {"source": {"id": 7, "type": "join"}, "type": "join", "timestamp": Date("2019-04-01").unix}
+            },
+            task_cluster_record()
+        )
+        emitter = RecordEmitter(template, ["source", "etl.id", "_id"])
+        for count in range(3):
+            record = {
+                "source": {
+                    "language": [],
+                    "is_file": True,
+                    "file": {"name": "a/b" + str(count) + ".js", "covered": [], "uncovered": [7], "total_covered": 0, "total_uncovered": 1, "percentage_covered": None}
+                },
+                "etl": {"id": count},
+                "_id": "tc.123:456.7." + str(count)
+            }
+            self._assert_same(emitter, template, record)
+
+    def _assert_same(self, emitter, template, record):
+        expected = json2value(value2json(set_default(deepcopy(record), deepcopy(unwrap(template)))))
+        result = json2value(emitter.encode(deepcopy(record)))
+        self.assertEqual(unwrap(result), unwrap(expected))
+        self.assertEqual(result._id, record["_id"])
+
+
+def task_cluster_record():
+    return {
+        "task": {"id": "abc", "state": "completed", "tags": [{"name": "a", "value": "b"}]},
+        "run": {"name": "test-linux64-ccov/debug-mochitest-2", "suite": {"name": "mochitest"}, "chunk": 2},
+        "repo": {"branch": {"name": "mozilla-central"}, "changeset": {"id": "0123456789ab"}, "push": {"date": 1554076800}},
+        "etl": {"id": 0, "source": {"id": 456, "source": {"id": 123}}, "type": "join"},
+        "build": {"platform": "linux64", "type": ["ccov", "debug"]}
+    }
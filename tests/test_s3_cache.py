@@ -0,0 +1,85 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import division
+from __future__ import unicode_literals
+
+from activedata_etl.imports import s3_cache
+from activedata_etl.imports.s3_cache import S3Cache
+from jx_sqlite.sqlite import Sqlite
+from mo_testing.fuzzytestcase import FuzzyTestCase
+
+
+class TestS3Cache(FuzzyTestCase):
+    """
+    THE INVENTORY IS TOPPED UP WITH LISTINGS IN STRING ORDER, BUT num ARE NUMBERS
+    """
+
+    def setUp(self):
+        self.keys = set()
+        self.original = s3_cache.aws.s3.Bucket
+        s3_cache.aws.s3.Bucket = lambda kwargs: _FakeBucket(self.keys)
+        self.db = Sqlite()
+
+    def tearDown(self):
+        s3_cache.aws.s3.Bucket = self.original
+
+    def inventory(self, **kwargs):
+        return S3Cache(db=self.db, bucket="fake", key_format="a:b.c", kwargs=kwargs)
+
+    def test_out_of_order(self):
+        self.keys.update(_keys("tc", [100, 101, 105]))
+        self.inventory(prefix="tc.", relist=10)
+        self.keys.update(_keys("tc", [103]))
+        inventory = self.inventory(prefix="tc.", relist=10)
+        self.assertEqual(inventory.get_nums("tc"), {100, 101, 103, 105})
+
+    def test_digit_rollover(self):
+        self.keys.update(_keys("", range(9950, 10000)))
+        self.inventory()
+        self.keys.update(_keys("", range(10000, 10050)))
+        inventory = self.inventory()
+        self.assertEqual(max(inventory.get_nums("")), 10049)
+        self.assertEqual(inventory.get_nums("", min_num=9950), set(range(9950, 10050)))
+
+    def test_prefix(self):
+        self.keys.update(_keys("tc", [7, 8]))
+        self.keys.update(_keys("bb", [9]))
+        inventory = self.inventory(prefix="tc.")
+        self.assertEqual(inventory.get_nums("tc"), {7, 8})
+
+
+def _keys(prefix, nums):
+    if prefix:
+        prefix += "."
+    return [prefix + str(n) + ":" + str(n * 10) + ".0.json.gz" for n in nums]
+
+
+class _FakeBucket(object):
+    def __init__(self, keys):
+        self.name = "fake"
+        self.bucket = self
+        self.keys = keys
+
+    def list(self, prefix, marker=None):
+        return [
+            _Meta(k)
+            for k in sorted(self.keys)
+            if k.startswith(prefix) and (marker is None or k > marker)
+        ]
+
+    def delete_keys(self, keys):
+        self.keys -= set(keys)
+
+
+class _Meta(object):
+    def __init__(self, key):
+        self.key = key
+        self.last_modified = 0
+        self.size = 1
@@ -0,0 +1,53 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import division
+from __future__ import unicode_literals
+
+from mo_testing.fuzzytestcase import FuzzyTestCase
+from pyLibrary.aws import LocalQueue
+
+
+class TestSQSBatch(FuzzyTestCase):
+    def test_extend_is_batched(self):
+        queue = LocalQueue("test")
+        queue.extend([{"key": i} for i in range(25)])
+        self.assertEqual(len(queue), 25)
+        self.assertEqual(queue.round_trips, 3)
+
+    def test_pop_messages(self):
+        queue = LocalQueue("test")
+        queue.extend([{"key": i} for i in range(25)])
+        queue.round_trips = 0
+
+        pairs = queue.pop_messages()
+        self.assertEqual([p.key for _, p in pairs], list(range(10)))
+        for message, _ in pairs:
+            message.delete()
+        self.assertEqual(queue.round_trips, 1)
+
+        # DELETES ARE SENT WITH THE NEXT READ
+        pairs = queue.pop_messages(max=3)
+        self.assertEqual([p.key for _, p in pairs], [10, 11, 12])
+        self.assertEqual(queue.round_trips, 3)
+
+    def test_rollback_returns_message(self):
+        queue = LocalQueue("test")
+        queue.extend([{"key": i} for i in range(3)])
+
+        pairs = queue.pop_messages()
+        pairs[0][0].delete()
+        pairs[1][0].rollback()
+        pairs[2][0].delete()
+        queue.flush()
+
+        self.assertEqual(len(queue), 1)
+        self.assertEqual(queue.pop().key, 1)
+        queue.commit()
+        self.assertEqual(len(queue), 0)